@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from threading import Lock
+
+from ingest import BASE_DIR
+
+
+CACHE_DB = os.path.join(BASE_DIR, "analysis_cache.sqlite3")
+CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MB", "256")) * 1024 * 1024
+CACHE_TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_TTL_HOURS", "168")) * 3600
+# Per-file tool results (e.g. Bandit findings by content hash) get their own table and budget,
+# so a scan of a large repo can't evict the model results
+FILE_CACHE_MAX_BYTES = int(os.getenv("FILE_RESULTS_CACHE_MB", "128")) * 1024 * 1024
+# Keys per query in get_many (SQLite limits bound parameters per statement)
+BATCH_SIZE = 500
+# Access times of hits are buffered and written with the next write, or after this many seconds / entries
+ACCESS_FLUSH_SECONDS = 30
+ACCESS_FLUSH_ENTRIES = 256
+# The running size total is checked against the table this often, to pick up other workers' writes
+TOTAL_RESYNC_SECONDS = 60
+
+
+class AnalysisCache:
+    """
+    On-disk, content-addressed cache for analysis results.
+
+    Entries are keyed by repo revision + endpoint + prompt version + model, so
+    a new commit, a prompt change or a model swap all miss naturally. The
+    SQLite file lives under workspace_data, survives restarts and is shared
+    by every uvicorn worker. Size is bounded by evicting least recently
+    accessed entries; entries also expire after a TTL. Each instance keeps
+    its entries, and its size budget, in its own `table`.
+
+    Hits don't write: their access times are buffered and flushed in
+    batches. The table's total size is kept as a running total rather than
+    summed on every write. All methods block on SQLite, so async code calls
+    them from a thread.
+    """
+
+    def __init__(self, path: str = CACHE_DB, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL_SECONDS,
+                 table: str = "entries"):
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = Lock()
+        self._conn = None
+        # Buffered access times of hits since the last flush, by key
+        self._accessed: dict[str, float] = {}
+        self._accessed_since = None
+        # Running total of the table's sizes, and when it was last summed from the table
+        self._total = 0
+        self._total_synced = None
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    expires REAL NOT NULL
+                )"""
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table}(accessed)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_expires ON {self.table}(expires)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(endpoint: str, revision: str, prompt_version: int, model: str) -> str:
+        raw = f"{endpoint}\0{revision}\0{prompt_version}\0{model}"
+        return f"{endpoint}:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+    def get(self, key: str):
+        endpoint = key.split(":", 1)[0]
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(f"SELECT value, expires FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                self.misses[endpoint] += 1
+                return None
+            self.hits[endpoint] += 1
+            self._touch(conn, [key], now)
+        return json.loads(row[0])
+
+    def set(self, key: str, value):
+        endpoint = key.split(":", 1)[0]
+        data = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            self._insert(conn, [(key, endpoint, data, len(data), now, now, now + self.ttl)], now)
+
+    def get_many(self, keys: list[str]) -> dict:
+        """Live values among `keys` ({key: value}), looked up in batches with one commit."""
+        found = {}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(keys), BATCH_SIZE):
+                batch = keys[start:start + BATCH_SIZE]
+                marks = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({marks}) AND expires >= ?", (*batch, now)
+                ).fetchall()
+                found.update(rows)
+            if found:
+                self._touch(conn, found, now)
+            for key in keys:
+                endpoint = key.split(":", 1)[0]
+                if key in found:
+                    self.hits[endpoint] += 1
+                else:
+                    self.misses[endpoint] += 1
+        return {key: json.loads(value) for key, value in found.items()}
+
+    def set_many(self, items: dict):
+        """Store every {key: value} in one transaction."""
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            data = json.dumps(value)
+            rows.append((key, key.split(":", 1)[0], data, len(data), now, now, now + self.ttl))
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            self._insert(conn, rows, now)
+
+    def _touch(self, conn: sqlite3.Connection, keys, now: float):
+        """Buffer hits' access times; write them once the buffer is old or large enough."""
+        for key in keys:
+            self._accessed[key] = now
+        if self._accessed_since is None:
+            self._accessed_since = now
+        if len(self._accessed) >= ACCESS_FLUSH_ENTRIES or now - self._accessed_since > ACCESS_FLUSH_SECONDS:
+            self._flush_accessed(conn)
+            conn.commit()
+
+    def _flush_accessed(self, conn: sqlite3.Connection):
+        if self._accessed:
+            conn.executemany(f"UPDATE {self.table} SET accessed = ? WHERE key = ?",
+                             [(accessed, key) for key, accessed in self._accessed.items()])
+        self._accessed = {}
+        self._accessed_since = None
+
+    def _insert(self, conn: sqlite3.Connection, rows: list[tuple], now: float):
+        """Insert or replace `rows` and enforce the budget, with buffered access times, in one transaction."""
+        self._sync_total(conn, now)
+        for start in range(0, len(rows), BATCH_SIZE):
+            keys = [row[0] for row in rows[start:start + BATCH_SIZE]]
+            marks = ",".join("?" * len(keys))
+            self._total -= conn.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM {self.table} WHERE key IN ({marks})", keys
+            ).fetchone()[0]
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {self.table} (key, endpoint, value, size, created, accessed, expires) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self._total += sum(row[3] for row in rows)
+        self._flush_accessed(conn)
+        self._evict(conn, now)
+        conn.commit()
+
+    def _sync_total(self, conn: sqlite3.Connection, now: float, force: bool = False):
+        """Re-read the running total from the table now and then, since other workers write to it too."""
+        if force or self._total_synced is None or now - self._total_synced > TOTAL_RESYNC_SECONDS:
+            self._total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+            self._total_synced = now
+
+    def _delete(self, conn: sqlite3.Connection, entries: list[tuple[str, int]]):
+        conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key, _ in entries])
+        for key, size in entries:
+            self._accessed.pop(key, None)
+            self._total -= size
+        self.evictions += len(entries)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently accessed ones until under budget."""
+        self._delete(conn, conn.execute(f"SELECT key, size FROM {self.table} WHERE expires < ?", (now,)).fetchall())
+        if self._total <= self.max_bytes:
+            return
+        # Confirm against the table before deleting anything
+        self._sync_total(conn, now, force=True)
+        victims = []
+        total = self._total
+        for key, size in conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed ASC"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key, size))
+            total -= size
+        self._delete(conn, victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            entries, size = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        hits = sum(self.hits.values())
+        lookups = hits + sum(self.misses.values())
+        endpoints = sorted(set(self.hits) | set(self.misses))
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": hits,
+            "misses": lookups - hits,
+            "evictions": self.evictions,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "by_endpoint": {
+                e: {"hits": self.hits[e], "misses": self.misses[e]} for e in endpoints
+            },
+        }
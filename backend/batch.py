@@ -0,0 +1,97 @@
+import asyncio
+import os
+from collections import Counter
+from contextlib import asynccontextmanager
+
+
+# Repos each batch stage works on at once
+BATCH_STAGE_LIMITS = {
+    "clone": int(os.getenv("BATCH_CLONE_WORKERS", "4")),
+    "scan": int(os.getenv("BATCH_SCAN_WORKERS", "2")),
+    "security": int(os.getenv("BATCH_SECURITY_WORKERS", "2")),
+    "llm": int(os.getenv("BATCH_LLM_WORKERS", os.getenv("OLLAMA_NUM_PARALLEL", "1"))),
+}
+# Repos of one batch in the pipeline at once; bounds how many loaded contexts a batch holds
+BATCH_IN_FLIGHT = int(os.getenv("BATCH_IN_FLIGHT", "8"))
+# Most repos accepted in one batch
+BATCH_MAX_REPOS = int(os.getenv("BATCH_MAX_REPOS", "500"))
+
+
+class StageLimiter:
+    """
+    Per-stage concurrency limits for batch analyses.
+
+    Every repo of a batch moves through clone -> scan -> security -> llm
+    on its own, and each stage admits at most `limits[stage]` repos at a
+    time. Stages therefore overlap across repos (one repo waits on the
+    model while the next is cloned and scanned) without any of them
+    running more work than the machine, or Ollama, can take.
+    """
+
+    def __init__(self, limits: dict[str, int] = BATCH_STAGE_LIMITS):
+        self.limits = {stage: max(1, limit) for stage, limit in limits.items()}
+        self._slots: dict[str, asyncio.Semaphore] | None = None
+        self._loop = None
+        self.waiting = Counter()
+        self.active = Counter()
+        self.completed = Counter()
+
+    def _ensure_slots(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._slots = {stage: asyncio.Semaphore(limit) for stage, limit in self.limits.items()}
+            self._loop = loop
+
+    @asynccontextmanager
+    async def slot(self, stage: str):
+        """Hold one of `stage`'s slots while the block runs."""
+        self._ensure_slots()
+        self.waiting[stage] += 1
+        try:
+            await self._slots[stage].acquire()
+        finally:
+            self.waiting[stage] -= 1
+        self.active[stage] += 1
+        try:
+            yield
+        finally:
+            self.active[stage] -= 1
+            self.completed[stage] += 1
+            self._slots[stage].release()
+
+    def stats(self) -> dict:
+        stats = {}
+        for stage, limit in self.limits.items():
+            stats[f"{stage}_limit"] = limit
+            stats[f"{stage}_waiting"] = self.waiting[stage]
+            stats[f"{stage}_active"] = self.active[stage]
+            stats[f"{stage}_completed"] = self.completed[stage]
+        return stats
+
+
+async def run_bounded(items, process, limit: int = BATCH_IN_FLIGHT):
+    """
+    Await `process(item)` for every item, at most `limit` at once, and
+    yield the results in the order they finish. Closing the generator
+    (e.g. the client went away) cancels whatever is still running.
+    """
+    items = iter(items)
+    pending = set()
+
+    def admit():
+        for item in items:
+            pending.add(asyncio.ensure_future(process(item)))
+            if len(pending) >= limit:
+                return
+
+    try:
+        admit()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                yield task.result()
+            admit()
+    finally:
+        for task in pending:
+            task.cancel()
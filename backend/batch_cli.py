@@ -0,0 +1,83 @@
+"""
+Analyze many repositories from the command line, without running the server.
+
+    python batch_cli.py https://github.com/org/a https://github.com/org/b --kinds security,quality
+    python batch_cli.py --file repos.txt --output results.ndjson
+
+Writes one NDJSON line per repo as it finishes (the same lines /api/batch
+streams), then a summary line. Logs go to stderr. Exits 1 if any repo failed.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+
+from batch import BATCH_IN_FLIGHT, BATCH_MAX_REPOS, BATCH_STAGE_LIMITS
+
+
+def read_repos(args) -> list[str]:
+    repos = list(args.repos)
+    if args.file:
+        with (sys.stdin if args.file == "-" else open(args.file, "r", encoding="utf-8")) as f:
+            repos += [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    return list(dict.fromkeys(repos))
+
+
+async def run(app, repos: list[str], kinds: list[str], framework: str, in_flight: int, out) -> int:
+    failed = 0
+    try:
+        async for line in app.batch_lines(repos, kinds, framework, in_flight):
+            out.write(line)
+            out.flush()
+            result = json.loads(line)
+            if "summary" in result:
+                summary = result["summary"]
+                print(f"📦 {summary['repos']} repos, {summary['failed']} failed, {summary['seconds']}s", file=sys.stderr)
+            else:
+                failed += result["status"] == "failed"
+                print(f"📦 {result['status']}: {result['repo_url']} ({result['seconds']}s)", file=sys.stderr)
+    finally:
+        await app.OLLAMA.aclose()
+    return 1 if failed else 0
+
+
+def cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("repos", nargs="*", help="GitHub URLs or local paths")
+    parser.add_argument("--file", help="Read repos from this file, one per line ('-' for stdin)")
+    parser.add_argument("--kinds", default="security", help="Comma-separated: security, quality, tests, git_insights")
+    parser.add_argument("--framework", default="auto", help="Test framework for the tests analysis")
+    parser.add_argument("--output", help="Write results here instead of stdout")
+    for stage, limit in BATCH_STAGE_LIMITS.items():
+        parser.add_argument(f"--{stage}-workers", type=int, default=limit, help=f"Repos in the {stage} stage at once")
+    parser.add_argument("--in-flight", type=int, default=BATCH_IN_FLIGHT, help="Repos in the pipeline at once")
+    args = parser.parse_args()
+
+    repos = read_repos(args)
+    if not repos:
+        parser.error("no repositories given")
+    if len(repos) > BATCH_MAX_REPOS:
+        parser.error(f"at most {BATCH_MAX_REPOS} repositories per batch (BATCH_MAX_REPOS)")
+    kinds = list(dict.fromkeys(k.strip() for k in args.kinds.split(",") if k.strip()))
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        # The analyzers log to stdout; keep it free for results
+        with contextlib.redirect_stdout(sys.stderr):
+            import main as app
+
+            unknown = [kind for kind in kinds if kind not in app.BATCH_ANALYSES]
+            if unknown or not kinds:
+                parser.error(f"unknown analysis kind. Expected any of: {', '.join(app.BATCH_ANALYSES)}")
+            for stage in app.BATCH_STAGES.limits:
+                app.BATCH_STAGES.limits[stage] = max(1, getattr(args, f"{stage}_workers"))
+            return asyncio.run(run(app, repos, kinds, args.framework, max(1, args.in_flight), out))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,5 @@
+"""
+Benchmarks for ingest, analysis and the API.
+
+Run from backend/:  python -m benchmarks --help
+"""
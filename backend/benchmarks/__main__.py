@@ -0,0 +1,345 @@
+"""
+Benchmark ingest, analysis and API endpoints on a synthetic repository.
+
+    cd backend
+    python -m benchmarks --files 2000 --commits 1000 --output bench.json
+    python -m benchmarks --baseline bench.json      # exit 1 on a p50 regression
+
+Everything runs in a throwaway workspace (WORKSPACE_DIR) against a stub
+Ollama server, so results reflect this code and the machine, not a model.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext, redirect_stdout
+from dataclasses import asdict, dataclass, field, fields
+
+from benchmarks.stub_ollama import StubOllama
+from benchmarks.synthetic import RepoShape, directories, make_remote, make_repo
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+GROUPS = ("scan", "clone", "api", "git", "security")
+# Advisory snapshot for the dependency checks: a fixed file, never a download, so results are reproducible offline
+ADVISORY_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "advisories.json")
+# p50 changes smaller than this (seconds) are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Linearly interpolated percentile (q in 0..100) of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def max_rss_bytes() -> int | None:
+    """
+    Peak resident set size of this process so far (ru_maxrss is KB on Linux,
+    bytes on macOS). Without the resource module (Windows) psutil's peak
+    working set is used if installed; None if neither is available.
+    """
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    return None
+
+
+@dataclass
+class Result:
+    name: str
+    unit: str
+    units: float                  # units of work per call (files, commits, requests)
+    samples: list[float] = field(default_factory=list)
+    wall: float = 0.0             # wall-clock time of all samples (concurrent runs overlap)
+    peak_python_bytes: int | None = None  # tracemalloc peak of one extra traced call
+    max_rss_bytes: int | None = None  # process high-water mark after this benchmark
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+        return {
+            "name": self.name,
+            "n": len(ordered),
+            "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+            "p50": percentile(ordered, 50),
+            "p90": percentile(ordered, 90),
+            "p99": percentile(ordered, 99),
+            "max": ordered[-1] if ordered else 0.0,
+            "throughput": self.units * len(ordered) / self.wall if self.wall else 0.0,
+            "unit": f"{self.unit}/s",
+            "peak_python_mb": None if self.peak_python_bytes is None else round(self.peak_python_bytes / 1024 ** 2, 2),
+            "max_rss_mb": None if self.max_rss_bytes is None else round(self.max_rss_bytes / 1024 ** 2, 1),
+        }
+
+
+class Bench:
+    def __init__(self, repeat: int, concurrency: int, verbose: bool):
+        self.repeat = repeat
+        self.concurrency = concurrency
+        self.verbose = verbose
+        self.results: list[Result] = []
+
+    def quiet(self):
+        """The app logs every step; keep that out of the report unless asked."""
+        return nullcontext() if self.verbose else redirect_stdout(io.StringIO())
+
+    def run(self, name, fn, setup=None, units=1, unit="ops", repeat=None, concurrent=False) -> Result:
+        """
+        Time `repeat` calls of `fn` (each after `setup`, untimed), then one
+        more under tracemalloc for peak Python memory. A single-call
+        benchmark (repeat=1, e.g. a first request that fills caches) can't
+        be repeated and tracing slows it several times over, so it only
+        reports the process RSS. With `concurrent`, calls are spread over
+        `concurrency` threads and throughput is measured over the whole batch.
+        """
+        repeat = repeat or self.repeat
+        result = Result(name, unit, units)
+        print(f"⏱️  {name} x{repeat}...", file=sys.stderr)
+
+        def timed():
+            started = time.perf_counter()
+            fn()
+            return time.perf_counter() - started
+
+        with self.quiet():
+            if concurrent and self.concurrency > 1:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                    result.samples = list(pool.map(lambda _: timed(), range(repeat)))
+                result.wall = time.perf_counter() - started
+            else:
+                for _ in range(repeat):
+                    if setup:
+                        setup()
+                    result.samples.append(timed())
+                result.wall = sum(result.samples)
+
+            if repeat > 1:
+                if setup:
+                    setup()
+                tracemalloc.start()
+                try:
+                    fn()
+                    result.peak_python_bytes = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+        result.max_rss_bytes = max_rss_bytes()
+        self.results.append(result)
+        return result
+
+
+def remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def run_benchmarks(args, shape: RepoShape, workdir: str) -> Bench:
+    # Imported only now: the app reads WORKSPACE_DIR, OLLAMA_URL, ... at import time
+    import ingest
+    import main
+    from fastapi.testclient import TestClient
+    from git_history import aggregates_path, mine_insights
+    from security.incremental import state_path
+    from security.pipeline import run_security_tools
+
+    bench = Bench(args.repeat, args.concurrency, args.verbose)
+    groups = set(args.only.split(",")) if args.only else set(GROUPS)
+
+    print(f"🏗️  Generating {shape.files} files, {shape.commits} commits...", file=sys.stderr)
+    started = time.perf_counter()
+    for name in ("source", "remote.git"):
+        remove(os.path.join(workdir, name))
+    source = make_repo(os.path.join(workdir, "source"), shape)
+    url = make_remote(source, os.path.join(workdir, "remote.git"))
+    print(f"🏗️  Generated in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    with bench.quiet():
+        files = ingest.scan_directory(source).file_count
+    clone = ingest.clone_path(url)
+
+    def drop_clone():
+        remove(clone)
+        remove(ingest.manifest_path(clone))
+        main.CONTEXT_STORE.invalidate(url)
+
+    if "scan" in groups:
+        bench.run("scan_directory (cold)", lambda: ingest.scan_directory(source),
+                  setup=lambda: remove(ingest.manifest_path(source)), units=files, unit="files")
+        bench.run("scan_directory (warm manifest)", lambda: ingest.scan_directory(source), units=files, unit="files")
+
+    if "clone" in groups:
+        bench.run("clone_and_scan (cold)", lambda: ingest.clone_and_scan(url), setup=drop_clone, units=files, unit="files")
+        bench.run("clone_and_scan (cached clone)", lambda: ingest.clone_and_scan(url), units=files, unit="files")
+
+    # The API benchmarks below start from an existing clone
+    with bench.quiet():
+        ingest.clone_and_scan(url)
+
+    with TestClient(main.app) as client:
+        def post(route, payload):
+            def call():
+                response = client.post(route, json=payload)
+                response.raise_for_status()
+            return call
+
+        if "api" in groups:
+            overview = post("/overview-fast", {"url": url})
+            bench.run("/overview-fast (context load)", overview,
+                      setup=lambda: main.CONTEXT_STORE.invalidate(url), units=files, unit="files")
+            bench.run("/overview-fast", overview, unit="requests", repeat=args.requests, concurrent=True)
+            bench.run("/structure (root)", post("/structure", {"url": url}),
+                      unit="requests", repeat=args.requests, concurrent=True)
+            deepest = directories(shape)[-1]
+            bench.run(f"/structure ({deepest})", post("/structure", {"url": url, "path": deepest}),
+                      unit="requests", repeat=args.requests, concurrent=True)
+
+        if "git" in groups:
+            # First call: unshallow the clone, walk the history, cache the analysis
+            bench.run("/api/git-insights (first)", post("/api/git-insights", {"repo_url": url}),
+                      units=shape.commits, unit="commits", repeat=1)
+            bench.run("/api/git-insights (cached)", post("/api/git-insights", {"repo_url": url}),
+                      unit="requests", repeat=args.requests, concurrent=True)
+            bench.run("mine_insights (cold)", lambda: mine_insights(clone),
+                      setup=lambda: remove(aggregates_path(clone)), units=shape.commits, unit="commits")
+            bench.run("mine_insights (incremental)", lambda: mine_insights(clone), units=shape.commits, unit="commits")
+
+        if "security" in groups:
+            # First call: every tool scans every file while the stub model answers
+            bench.run("/api/analyze-security (first)", post("/api/analyze-security", {"repo_url": url}),
+                      units=files, unit="files", repeat=1)
+            bench.run("/api/analyze-security (cached)", post("/api/analyze-security", {"repo_url": url}),
+                      unit="requests", repeat=args.requests, concurrent=True)
+            bench.run("security tools (cold)", lambda: run_security_tools(clone),
+                      setup=lambda: remove(state_path(clone)), units=files, unit="files",
+                      repeat=args.slow_repeat)
+            bench.run("security tools (incremental)", lambda: run_security_tools(clone), units=files, unit="files")
+    return bench
+
+
+def environment(args, shape: RepoShape) -> dict:
+    git_version = subprocess.run(["git", "--version"], capture_output=True, text=True).stdout.strip()
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "git": git_version,
+        "shape": asdict(shape),
+        "repeat": args.repeat,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "ollama_latency": args.ollama_latency,
+    }
+
+
+def format_table(summaries: list[dict], regressions: dict[str, float]) -> str:
+    header = "| Benchmark | n | p50 ms | p90 ms | p99 ms | max ms | Throughput | Peak Py MB | Max RSS MB |"
+    lines = [header, "|---|---|---|---|---|---|---|---|---|"]
+    for s in summaries:
+        name = s["name"]
+        if name in regressions:
+            name += f" ⚠️ +{regressions[name]:.0%}"
+        peak = "-" if s["peak_python_mb"] is None else f"{s['peak_python_mb']:.1f}"
+        rss = "-" if s["max_rss_mb"] is None else f"{s['max_rss_mb']:.0f}"
+        lines.append(
+            f"| {name} | {s['n']} | {s['p50'] * 1000:.1f} | {s['p90'] * 1000:.1f} | {s['p99'] * 1000:.1f} | "
+            f"{s['max'] * 1000:.1f} | {s['throughput']:.1f} {s['unit']} | {peak} | {rss} |"
+        )
+    return "\n".join(lines)
+
+
+def find_regressions(summaries: list[dict], baseline_path: str, tolerance: float) -> dict[str, float]:
+    """Benchmarks whose p50 grew by more than `tolerance` (a fraction) over the baseline report."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {s["name"]: s for s in json.load(f).get("results", [])}
+    regressions = {}
+    for s in summaries:
+        old = baseline.get(s["name"])
+        if not old or not old["p50"]:
+            continue
+        if s["p50"] - old["p50"] > MIN_REGRESSION_SECONDS and s["p50"] > old["p50"] * (1 + tolerance):
+            regressions[s["name"]] = s["p50"] / old["p50"] - 1
+    return regressions
+
+
+def parse_args(argv=None):
+    defaults = RepoShape()
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.split("\n\n")[0].strip())
+    shape = parser.add_argument_group("synthetic repository")
+    for f in fields(RepoShape):
+        shape.add_argument(
+            f"--{f.name}", type=type(getattr(defaults, f.name)), default=getattr(defaults, f.name), help="(default: %(default)s)"
+        )
+    parser.add_argument("--only", help=f"comma-separated groups to run (default: all of {','.join(GROUPS)})")
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls per benchmark")
+    parser.add_argument("--slow-repeat", type=int, default=2, help="timed calls of full security scans")
+    parser.add_argument("--requests", type=int, default=200, help="requests per warm endpoint benchmark")
+    parser.add_argument("--concurrency", type=int, default=4, help="client threads for warm endpoint benchmarks")
+    parser.add_argument("--ollama-latency", type=float, default=0.05, help="stub model latency per call (s)")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="JSON report to compare p50s against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown vs the baseline")
+    parser.add_argument("--workdir", help="keep repos and workspace here instead of a temp dir")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own logging")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    shape = RepoShape(**{f.name: getattr(args, f.name) for f in fields(RepoShape)})
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="devmind-bench-")
+    stub = StubOllama(latency=args.ollama_latency).start()
+    os.environ.update(
+        WORKSPACE_DIR=os.path.join(workdir, "workspace"),
+        OLLAMA_URL=stub.url,
+        REPO_REFRESH_SECONDS="0",
+        ADVISORY_DB_PATH=ADVISORY_FIXTURE,
+        ADVISORY_DB_URL="",
+    )
+    try:
+        bench = run_benchmarks(args, shape, workdir)
+    finally:
+        stub.stop()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summaries = [r.summary() for r in bench.results]
+    regressions = find_regressions(summaries, args.baseline, args.tolerance) if args.baseline else {}
+    print(format_table(summaries, regressions))
+    if args.output:
+        report = {"environment": environment(args, shape), "results": summaries}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {args.output}", file=sys.stderr)
+    if regressions:
+        print(f"❌ {len(regressions)} benchmark(s) slower than the baseline by more than {args.tolerance:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
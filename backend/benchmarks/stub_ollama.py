@@ -0,0 +1,73 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+FILE_HEADER_RE = re.compile(r"--- FILE: (.*?)(?: \(first \d+ chars\))? ---")
+
+
+class StubOllama:
+    """
+    A minimal stand-in for Ollama's /api/generate, so analysis endpoints can
+    be benchmarked without a model. Every call sleeps `latency` seconds
+    (streams spread it over a few tokens) and answers with something the
+    callers parse: {"issues": []} in JSON mode, a path -> summary map for
+    file-summary prompts, plain text otherwise.
+    """
+
+    def __init__(self, latency: float = 0.05, host: str = "127.0.0.1", port: int = 0):
+        stub = self
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub._lock:
+                    stub.calls += 1
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for token in ("stub", " streamed", " answer", ""):
+                        time.sleep(stub.latency / 4)
+                        line = (json.dumps({"response": token, "done": not token}) + "\n").encode()
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                time.sleep(stub.latency)
+                data = json.dumps({"response": stub.answer(body.get("prompt", ""), body.get("format") == "json")}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}"
+
+    @staticmethod
+    def answer(prompt: str, is_json: bool) -> str:
+        if prompt.startswith("Summarize what each file"):
+            return json.dumps({path: "Generated module with small helper functions." for path in FILE_HEADER_RE.findall(prompt)})
+        if is_json:
+            return '{"issues": []}'
+        return "Stub answer."
+
+    def start(self) -> "StubOllama":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
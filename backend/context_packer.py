@@ -0,0 +1,137 @@
+import os
+import posixpath
+
+from ingest import FileChunk
+from retrieval import estimate_tokens
+
+
+# Upper bound on the code context packed into each analysis prompt, in tokens
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "1500"))
+# Context window assumed for models not listed in MODEL_CONTEXT_WINDOWS (Ollama's default num_ctx)
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("DEFAULT_CONTEXT_WINDOW", "4096"))
+# Tokens reserved for the instructions and JSON schema wrapped around the code
+PROMPT_OVERHEAD_TOKENS = 400
+
+
+def parse_context_windows(value: str) -> dict[str, int]:
+    """Parse "model=tokens,model=tokens" (e.g. "llama3.1:8b=8192,qwen2.5-coder=32768")."""
+    windows = {}
+    for item in value.split(","):
+        name, _, tokens = item.strip().rpartition("=")
+        if name and tokens.isdigit():
+            windows[name.strip()] = int(tokens)
+    return windows
+
+
+MODEL_CONTEXT_WINDOWS = parse_context_windows(os.getenv("MODEL_CONTEXT_WINDOWS", ""))
+
+
+def model_context_window(model: str) -> int:
+    """Context window of `model`: an exact entry, else its family (name before ":"), else the default."""
+    if model in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[model]
+    return MODEL_CONTEXT_WINDOWS.get(model.split(":", 1)[0], DEFAULT_CONTEXT_WINDOW)
+
+
+def context_budget(model: str, output_tokens: int = 1024) -> int:
+    """Tokens of code context that fit in `model`'s window next to the prompt and its answer."""
+    room = model_context_window(model) - output_tokens - PROMPT_OVERHEAD_TOKENS
+    return max(256, min(PROMPT_CONTEXT_TOKENS, room))
+
+
+READMES = {"readme.md", "readme.rst", "readme.txt"}
+MANIFESTS = {
+    "package.json", "requirements.txt", "pyproject.toml", "setup.py", "setup.cfg",
+    "cargo.toml", "go.mod", "pom.xml", "build.gradle", "gemfile", "composer.json",
+    "dockerfile", "docker-compose.yml", "docker-compose.yaml", "makefile", "procfile",
+}
+ENTRY_POINTS = {
+    "main", "app", "index", "server", "__main__", "manage", "cli", "wsgi", "asgi",
+    "program", "application", "lib", "mod",
+}
+# Generated files that say little about the code and would crowd out everything else
+LOW_VALUE = {"package-lock.json", "pnpm-lock.yaml", "yarn.lock", "composer.lock", "poetry.lock"}
+
+
+def file_priority(path: str) -> tuple[int, int]:
+    """Sort key: READMEs, manifests, entry points, source, tests/docs, generated files; shallow first."""
+    name = posixpath.basename(path).lower()
+    stem = os.path.splitext(name)[0]
+    depth = path.count("/")
+    if name in LOW_VALUE:
+        tier = 9
+    elif name in READMES:
+        tier = 0 if depth == 0 else 4
+    elif name in MANIFESTS:
+        tier = 1
+    elif stem in ENTRY_POINTS:
+        tier = 2
+    elif "test" in path.lower() or name.endswith((".md", ".rst", ".txt")):
+        tier = 4
+    else:
+        tier = 3
+    return tier, depth
+
+
+class ContextPacker:
+    """
+    Packs a repository's chunks into a token budget for analysis prompts.
+
+    Files are taken in priority order (see file_priority) as whole files
+    when they fit; otherwise their leading chunks, which always end on a
+    line boundary. No file may take more than `max_file_share` of the
+    budget, so one large file can't crowd out the rest. Token costs are
+    computed once per file, on first use, and packed results are memoized per budget.
+    """
+
+    def __init__(self, chunks: list[FileChunk], max_file_share: float = 0.4):
+        self.max_file_share = max_file_share
+        files: dict[str, list[FileChunk]] = {}
+        for chunk in chunks:
+            files.setdefault(chunk.path, []).append(chunk)
+        order = sorted(enumerate(files), key=lambda item: (file_priority(item[1]), item[0]))
+        self.files = [(path, files[path]) for _, path in order]
+        self._costs: dict[str, list[int]] = {}
+        self._packed: dict[int, str] = {}
+
+    def costs(self, path: str, chunks: list[FileChunk]) -> list[int]:
+        costs = self._costs.get(path)
+        if costs is None:
+            costs = self._costs[path] = [estimate_tokens(c.text) for c in chunks]
+        return costs
+
+    def pack(self, token_budget: int) -> str:
+        packed = self._packed.get(token_budget)
+        if packed is None:
+            packed = self._packed[token_budget] = self._pack(token_budget)
+        return packed
+
+    def _pack(self, token_budget: int) -> str:
+        file_limit = max(int(token_budget * self.max_file_share), 1)
+        parts = []
+        used = 0
+        for path, chunks in self.files:
+            remaining = token_budget - used
+            header_cost = estimate_tokens(path) + 8
+            if remaining < header_cost + 32:
+                break
+            # Cheap length check first: code averages well under 8 characters per token
+            if len(chunks[0].text) > 8 * (remaining - header_cost):
+                continue
+            costs = self.costs(path, chunks)
+            # Always allow one whole chunk, so files with a large first chunk still get a look-in
+            limit = min(remaining - header_cost, max(file_limit, costs[0]))
+            taken = 0
+            cost = 0
+            while taken < len(chunks) and cost + costs[taken] <= limit:
+                cost += costs[taken]
+                taken += 1
+            if taken == 0:
+                continue
+            if taken == len(chunks):
+                parts.append(f"\n\n--- FILE: {path} ---\n")
+            else:
+                parts.append(f"\n\n--- FILE: {path} (first {chunks[taken - 1].end} chars) ---\n")
+            parts.extend(c.text for c in chunks[:taken])
+            used += header_cost + cost
+        return "".join(parts)
@@ -0,0 +1,268 @@
+import os
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from threading import Lock
+
+from ingest import (
+    ChunkStore,
+    checkout_revision,
+    clone_and_scan,
+    clone_path,
+    fetch_updates,
+    is_managed_clone,
+    last_fetch_time,
+    repo_revision,
+)
+from context_packer import ContextPacker
+from metrics import REPO_CONTEXT_BYTES, STAGE_SECONDS
+from repo_index import RepoIndex
+from retrieval import BM25Index, format_chunks, select_chunks
+
+
+MAX_REPOS = int(os.getenv("CONTEXT_MAX_REPOS", "32"))
+MAX_BYTES = int(os.getenv("CONTEXT_MAX_MB", "512")) * 1024 * 1024
+# Cloned repos not fetched for this many seconds are refreshed in the background (0 = never)
+REFRESH_SECONDS = float(os.getenv("REPO_REFRESH_SECONDS", "600"))
+
+
+class RepoContext:
+    """The scanned chunks and on-disk location of one repository."""
+
+    def __init__(self, url: str, store: ChunkStore | None, path: str | None, error: str | None = None):
+        self.url = url
+        self.store = store
+        self.path = path
+        self.error = error
+        # Retrieval index is built once at load time and reused for every question
+        self.index = BM25Index(store.chunks) if store is not None else None
+        # Stats and directory tree served by /overview-fast and /structure
+        self.repo_index = RepoIndex(store.tree, store.line_counts) if store is not None else None
+        # Commit SHA (or content fingerprint) that analysis results are cached under
+        self.revision = repo_revision(path, store) if self.ok else None
+        self._packer = None
+        # Memory charged against CONTEXT_MAX_MB: the chunks plus everything built from them
+        self.size_bytes = self.store.memory_bytes() + self.index.memory_bytes() if store is not None else 0
+        self.loaded_at = time.time()
+        self.last_access = self.loaded_at
+
+    @property
+    def ok(self) -> bool:
+        return self.path is not None and self.store is not None
+
+    def packed(self, token_budget: int) -> str:
+        """The repo's most informative files (READMEs, manifests, entry points first) within `token_budget` tokens."""
+        if not self.ok:
+            return self.error
+        if self._packer is None:
+            self._packer = ContextPacker(self.store.chunks)
+        return self._packer.pack(token_budget)
+
+    def relevant(self, query: str, token_budget: int) -> str:
+        """Context made of the chunks most relevant to `query`, within `token_budget` tokens."""
+        if not self.ok:
+            return self.error
+        chunks = select_chunks(self.index, self.store.chunks, query, token_budget)
+        if not chunks:
+            # Nothing matched the query; fall back to the repo's key files
+            return self.packed(token_budget)
+        return format_chunks(chunks)
+
+
+class ContextStore:
+    """
+    Keyed registry of repository contexts with LRU + memory-budget eviction.
+
+    Each repository gets its own lock, so loading one repo never blocks
+    requests for another. Failed loads are returned but never cached.
+
+    Cloned repos whose last fetch is older than `refresh_seconds` are
+    fetched on a background thread while the current context keeps being
+    served; if the remote moved, the checkout is updated and the context
+    dropped so the next request rescans the new revision.
+    """
+
+    def __init__(
+        self,
+        max_repos: int = MAX_REPOS,
+        max_bytes: int = MAX_BYTES,
+        loader=clone_and_scan,
+        refresh_seconds: float = REFRESH_SECONDS,
+        workspace=None,
+    ):
+        self.max_repos = max_repos
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.refresh_seconds = refresh_seconds
+        # Optional WorkspaceManager: clones are leased while loading/refreshing and recorded for its quota
+        self.workspace = workspace
+        self._refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="refresh")
+        self._refreshing: set[str] = set()
+        # Repos whose update waits for their clone to be free of other leases; retried on next access
+        self._deferred: set[str] = set()
+        self.refreshes = 0
+        self.refresh_updates = 0
+        self.refresh_deferrals = 0
+        self.refresh_failures = 0
+        self._entries: OrderedDict[str, RepoContext] = OrderedDict()
+        self._repo_locks: dict[str, Lock] = {}
+        # Threads holding or waiting for each repo lock; a lock is dropped once nobody uses it
+        self._repo_lock_users = Counter()
+        self._lock = Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, url: str) -> RepoContext | None:
+        ctx = self._entries.get(url)
+        if ctx is not None:
+            self._entries.move_to_end(url)
+            ctx.last_access = time.time()
+        return ctx
+
+    def get(self, url: str) -> RepoContext:
+        with self._lock:
+            ctx = self._lookup(url)
+            if ctx is not None:
+                self.hits += 1
+        if ctx is not None:
+            if self.workspace:
+                self.workspace.touch(ctx.path)
+            self._maybe_refresh(url, ctx)
+            return ctx
+        with self._repo_lock(url):
+            # check again in case another thread just finished it
+            with self._lock:
+                ctx = self._lookup(url)
+                if ctx is not None:
+                    self.hits += 1
+                    return ctx
+                self.misses += 1
+
+            print(f"🔄 Loading context for: {url}")
+            lease = self.workspace.lease(clone_path(url), must_exist=False) if self.workspace else nullcontext()
+            with lease:
+                with STAGE_SECONDS.time(stage="clone_and_scan"):
+                    store, path = self.loader(url)
+                if path is None:
+                    print(f"❌ Clone failed! {store}")
+                    return RepoContext(url, None, None, error="Error: Repository could not be cloned.")
+                with STAGE_SECONDS.time(stage="index_build"):
+                    ctx = RepoContext(url, store, path)
+                if self.workspace:
+                    self.workspace.record(url, path, ctx.revision)
+            REPO_CONTEXT_BYTES.observe(ctx.size_bytes)
+
+            with self._lock:
+                self._entries[url] = ctx
+                self._bytes += ctx.size_bytes
+                self._evict(keep=url)
+        self._maybe_refresh(url, ctx)
+        return ctx
+
+    @contextmanager
+    def _repo_lock(self, url: str):
+        """Hold `url`'s own lock while the block runs."""
+        with self._lock:
+            lock = self._repo_locks.setdefault(url, Lock())
+            self._repo_lock_users[url] += 1
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                self._repo_lock_users[url] -= 1
+                if self._repo_lock_users[url] <= 0:
+                    del self._repo_lock_users[url]
+                    del self._repo_locks[url]
+
+    def _maybe_refresh(self, url: str, ctx: RepoContext):
+        if not self.refresh_seconds or not ctx.ok or not is_managed_clone(ctx.path):
+            return
+        with self._lock:
+            deferred = url in self._deferred
+        if not deferred and time.time() - last_fetch_time(ctx.path) < self.refresh_seconds:
+            return
+        with self._lock:
+            if url in self._refreshing:
+                return
+            self._refreshing.add(url)
+        self._refresh_pool.submit(self._refresh, url, ctx.path)
+
+    def _refresh(self, url: str, path: str):
+        lease = self.workspace.lease(path) if self.workspace else nullcontext()
+        with self._lock:
+            self._deferred.discard(url)
+        try:
+            with lease:
+                upstream = fetch_updates(path)
+                with self._lock:
+                    self.refreshes += 1
+                if upstream:
+                    # Hold the repo's lock so no load scans the checkout mid-update, and never
+                    # move it under a scan or analysis holding the clone: retry on next access
+                    with self._repo_lock(url):
+                        with self.workspace.exclusive(path) if self.workspace else nullcontext(True) as free:
+                            if free:
+                                checkout_revision(path, upstream)
+                                self.invalidate(url)
+                    with self._lock:
+                        if free:
+                            self.refresh_updates += 1
+                        else:
+                            self._deferred.add(url)
+                            self.refresh_deferrals += 1
+                    if free:
+                        print(f"🔃 Updated {url} to {upstream[:7]}")
+                    else:
+                        print(f"⏸️  Update of {url} deferred: its clone is in use")
+                        upstream = None
+            if upstream and self.workspace:
+                self.workspace.record(url, path, upstream)
+        except Exception as e:
+            with self._lock:
+                self.refresh_failures += 1
+            print(f"⚠️  Background refresh failed for {url}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(url)
+
+    def _evict(self, keep: str):
+        """Drop least recently used entries until both budgets are satisfied."""
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_repos or self._bytes > self.max_bytes
+        ):
+            url, ctx = next(iter(self._entries.items()))
+            if url == keep:
+                break
+            del self._entries[url]
+            self._bytes -= ctx.size_bytes
+            self.evictions += 1
+            print(f"🧹 Evicted context: {url}")
+
+    def invalidate(self, url: str):
+        with self._lock:
+            ctx = self._entries.pop(url, None)
+            if ctx is not None:
+                self._bytes -= ctx.size_bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "repos": len(self._entries),
+                "bytes": self._bytes,
+                "max_repos": self.max_repos,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "refreshes": self.refreshes,
+                "refresh_updates": self.refresh_updates,
+                "refresh_failures": self.refresh_failures,
+                "refresh_deferrals": self.refresh_deferrals,
+                "refreshing": len(self._refreshing),
+            }
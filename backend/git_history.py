@@ -0,0 +1,229 @@
+import os
+import subprocess
+from collections import Counter
+from typing import Iterable, Iterator, NamedTuple
+
+from ingest import BASE_DIR, load_json, repo_state_path, save_json
+from metrics import STAGE_SECONDS
+
+
+# 0 = no limit. Aggregates are persisted, so only the first run walks the whole history.
+GIT_INSIGHTS_MAX_COMMITS = int(os.getenv("GIT_INSIGHTS_MAX_COMMITS", "0"))
+# Deepen shallow clones before the first insights run so totals are not truncated
+GIT_INSIGHTS_FULL_HISTORY = os.getenv("GIT_INSIGHTS_FULL_HISTORY", "true").lower() in ("1", "true", "yes")
+
+# Per-repo persisted aggregates (contributors, file churn, monthly counts) keyed by last processed commit
+AGGREGATES_DIR = os.path.join(BASE_DIR, "git_insights")
+AGGREGATES_VERSION = 1
+
+# Record/field separators that cannot appear in git's formatted output
+RECORD_SEP = "\x1e"
+FIELD_SEP = "\x1f"
+LOG_FORMAT = f"{RECORD_SEP}%H{FIELD_SEP}%an{FIELD_SEP}%cI{FIELD_SEP}%s"
+
+
+class CommitRecord(NamedTuple):
+    sha: str
+    author: str
+    date: str
+    message: str
+    files: list[str]
+
+
+def iter_commits(repo_path: str, max_count: int | None = None, since: str | None = None) -> Iterator[CommitRecord]:
+    """
+    Stream commits (newest first) with the files each one touched, from a
+    single `git log --name-only` process parsed line by line. Only trees are
+    compared, so no file contents are read (and none fetched in partial clones).
+
+    `since` limits the walk to commits not reachable from that SHA.
+    Raises RuntimeError if git fails (e.g. not a repository).
+    """
+    command = ["git", "-C", repo_path, "-c", "core.quotePath=false", "log", "--name-only", "--no-renames", f"--format={LOG_FORMAT}"]
+    if max_count:
+        command.append(f"--max-count={max_count}")
+    command.append(f"{since}..HEAD" if since else "HEAD")
+
+    proc = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    header = None
+    files = []
+    try:
+        for line in proc.stdout:
+            line = line.rstrip("\n")
+            if line.startswith(RECORD_SEP):
+                if header is not None:
+                    yield CommitRecord(*header, files)
+                header = line[1:].split(FIELD_SEP, 3)
+                files = []
+            elif line:
+                files.append(line)
+        if header is not None:
+            yield CommitRecord(*header, files)
+    finally:
+        proc.stdout.close()
+        stderr = proc.stderr.read()
+        proc.stderr.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"git log failed: {stderr.strip()}")
+
+
+def git_output(repo_path: str, *args: str, timeout: float | None = 60) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ["git", "-C", repo_path, *args], capture_output=True, text=True, timeout=timeout
+    )
+
+
+def head_sha(repo_path: str) -> str:
+    result = git_output(repo_path, "rev-parse", "HEAD")
+    if result.returncode != 0:
+        raise RuntimeError(f"git rev-parse failed: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+
+def is_ancestor(repo_path: str, old: str, new: str) -> bool:
+    return git_output(repo_path, "merge-base", "--is-ancestor", old, new).returncode == 0
+
+
+def ensure_full_history(repo_path: str):
+    """Deepen a shallow clone so insights cover the whole history (best effort)."""
+    if git_output(repo_path, "rev-parse", "--is-shallow-repository").stdout.strip() != "true":
+        return
+    print(f"⬇️  Fetching full history for insights: {repo_path}")
+    try:
+        result = git_output(repo_path, "fetch", "--unshallow", "--quiet", timeout=600)
+        if result.returncode != 0:
+            print(f"⚠️  Could not unshallow: {result.stderr.strip()}")
+    except subprocess.TimeoutExpired:
+        print("⚠️  Unshallow timed out, using the shallow history")
+
+
+def aggregates_path(repo_path: str) -> str:
+    return repo_state_path(AGGREGATES_DIR, "insights", repo_path)
+
+
+def load_aggregates(repo_path: str) -> dict | None:
+    return load_json(aggregates_path(repo_path), AGGREGATES_VERSION)
+
+
+def save_aggregates(repo_path: str, aggregates: dict):
+    save_json(aggregates_path(repo_path), aggregates, "git aggregates")
+
+
+def new_aggregates() -> dict:
+    return {
+        "version": AGGREGATES_VERSION,
+        "head": None,
+        "total_commits": 0,
+        "first_commit": None,
+        "last_commit": None,
+        "recent_commits": [],
+        "authors": {},
+        "files": {},
+        "monthly": {},
+    }
+
+
+def fold_commits(aggregates: dict, commits: Iterable[CommitRecord]) -> int:
+    """Add commits (newest first, none already counted) into the aggregates. Returns how many."""
+    authors = Counter(aggregates["authors"])
+    files = Counter(aggregates["files"])
+    monthly = Counter(aggregates["monthly"])
+    recent = []
+    newest = oldest = None
+    count = 0
+
+    for commit in commits:
+        if newest is None:
+            newest = commit
+        oldest = commit
+        count += 1
+        if len(recent) < 10:
+            recent.append(
+                {
+                    "hash": commit.sha[:7],
+                    "message": commit.message.strip()[:100],
+                    "author": commit.author,
+                    "date": commit.date,
+                    "files_changed": len(commit.files),
+                }
+            )
+        authors[commit.author] += 1
+        files.update(commit.files)
+        monthly[commit.date[:7]] += 1
+
+    if count:
+        aggregates["total_commits"] += count
+        aggregates["last_commit"] = newest.date
+        if aggregates["first_commit"] is None:
+            aggregates["first_commit"] = oldest.date
+        aggregates["recent_commits"] = (recent + aggregates["recent_commits"])[:10]
+        aggregates["authors"] = dict(authors)
+        aggregates["files"] = dict(files)
+        aggregates["monthly"] = dict(monthly)
+    return count
+
+
+def refresh_aggregates(repo_path: str, max_count: int = GIT_INSIGHTS_MAX_COMMITS) -> dict:
+    """
+    Bring the persisted aggregates up to the repo's current HEAD.
+
+    When the last processed commit is an ancestor of HEAD only the new
+    commits are read; otherwise (first run, force-push, rebase) the
+    aggregates are rebuilt from the full history.
+    """
+    head = head_sha(repo_path)
+    aggregates = load_aggregates(repo_path)
+    if aggregates is not None and aggregates["head"] == head:
+        return aggregates
+
+    if aggregates is not None and is_ancestor(repo_path, aggregates["head"], head):
+        since = aggregates["head"]
+    else:
+        aggregates = new_aggregates()
+        since = None
+        if GIT_INSIGHTS_FULL_HISTORY:
+            ensure_full_history(repo_path)
+
+    added = fold_commits(aggregates, iter_commits(repo_path, max_count=max_count, since=since))
+    print(f"📈 Folded {added} new commits into git insights ({aggregates['total_commits']} total).")
+    aggregates["head"] = head
+    save_aggregates(repo_path, aggregates)
+    return aggregates
+
+
+def top(counts: dict, n: int = 10) -> list[tuple[str, int]]:
+    """Highest counts first, ties broken by name so results don't depend on fold order."""
+    return sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:n]
+
+
+def insights_from_aggregates(aggregates: dict) -> dict:
+    return {
+        "total_commits": aggregates["total_commits"],
+        "contributors": [
+            {"name": name, "commits": count} for name, count in top(aggregates["authors"])
+        ],
+        "recent_commits": aggregates["recent_commits"],
+        "most_changed_files": [
+            {"file": f, "changes": c} for f, c in top(aggregates["files"])
+        ],
+        "commit_frequency": [
+            {"month": k, "commits": v}
+            for k, v in sorted(aggregates["monthly"].items())[-12:]
+        ],
+        "first_commit": aggregates["first_commit"],
+        "last_commit": aggregates["last_commit"],
+    }
+
+
+def mine_insights(repo_path: str) -> dict:
+    """Contributor, churn and frequency insights over the repo's whole history."""
+    with STAGE_SECONDS.time(stage="git_insights"):
+        return insights_from_aggregates(refresh_aggregates(repo_path))
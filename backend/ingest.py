@@ -2,13 +2,20 @@ import os
 import shutil
 import git
 import time
-import glob
 import stat
 import hashlib
 import json
+import subprocess
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, NamedTuple
 
+from metrics import STAGE_SECONDS
 
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../workspace_data"))
+
+# Clones, manifests, caches and scan state; override to keep separate workspaces (e.g. benchmarks)
+BASE_DIR = os.path.abspath(os.getenv("WORKSPACE_DIR") or os.path.join(os.path.dirname(__file__), "../workspace_data"))
 
 ALLOWED_EXTENSIONS = {
     ".py", ".js", ".ts", ".tsx", ".jsx", ".java", ".cpp", ".h", ".c",
@@ -20,14 +27,43 @@ ALLOWED_EXTENSIONS = {
 }
 
 IGNORE_DIRS = {
-    ".git", "node_modules", "__pycache__", "dist", "build", "venv",
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", "dist", "build", "venv",
     ".idea", ".vscode", ".mypy_cache", ".pytest_cache", "coverage",
     ".next", ".nuxt", "target", "out", "bin", "obj", ".gradle",
-    "vendor", ".bundle", "eggs", ".eggs",
+    "vendor", ".bundle", "eggs", ".eggs", ".tox",
 }
 
 SPECIAL_FILES = {"Dockerfile", "Makefile", "Jenkinsfile", "Procfile", ".env.example"}
 
+LANGUAGE_MAP = {
+    ".py": "Python", ".js": "JavaScript", ".ts": "TypeScript", ".tsx": "TypeScript",
+    ".jsx": "JavaScript", ".java": "Java", ".cpp": "C++", ".c": "C", ".h": "C/C++",
+    ".go": "Go", ".rs": "Rust", ".rb": "Ruby", ".html": "HTML", ".css": "CSS",
+    ".scss": "SCSS", ".json": "JSON", ".md": "Markdown", ".yml": "YAML",
+    ".yaml": "YAML", ".sql": "SQL", ".sh": "Shell", ".vue": "Vue",
+    ".svelte": "Svelte", ".xml": "XML", ".toml": "TOML", ".graphql": "GraphQL",
+}
+
+MAX_FILE_CHARS = 15000
+CHUNK_CHARS = 2000
+
+# Files are read in bounded blocks; only enough bytes for MAX_FILE_CHARS of UTF-8 are kept
+READ_BUFFER_BYTES = 1024 * 1024
+MAX_CONTENT_BYTES = MAX_FILE_CHARS * 4
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+
+# Clone strategy for remote repos: history depth (0 = full), partial-clone filter ("" = none),
+# and whether to check out only files the scanner reads (sparse checkout)
+CLONE_DEPTH = int(os.getenv("CLONE_DEPTH", "50"))
+CLONE_FILTER = os.getenv("CLONE_FILTER", "blob:none")
+CLONE_SPARSE = os.getenv("CLONE_SPARSE", "false").lower() in ("1", "true", "yes")
+CLONE_TIMEOUT = float(os.getenv("CLONE_TIMEOUT", "600"))
+
+# Per-repo file manifests (path -> size, mtime, content hash, line count, chunk offsets) used for incremental
+# rescans; content is not stored, unchanged files are read back from the clone
+MANIFEST_DIR = os.path.join(BASE_DIR, "manifests")
+MANIFEST_VERSION = 3
+
 
 def handle_remove_readonly(func, path, exc):
     """Helper to force delete read-only files on Windows."""
@@ -35,80 +71,423 @@ def handle_remove_readonly(func, path, exc):
     func(path)
 
 
-def cleanup_old_repos():
-    """Delete old repos inside the workspace_data folder."""
-    if os.path.exists(BASE_DIR):
-        search_path = os.path.join(BASE_DIR, "repo_*")
-        for folder in glob.glob(search_path):
-            try:
-                shutil.rmtree(folder, onerror=handle_remove_readonly)
-                print(f"🧹 Deleted old: {folder}")
-            except Exception:
-                pass
+def repo_state_path(directory: str, prefix: str, repo_path: str) -> str:
+    """Where state about a repo is kept outside its clone: `directory`/`prefix`_<hash of its absolute path>.json."""
+    key = hashlib.sha256(os.path.abspath(repo_path).encode()).hexdigest()[:12]
+    return os.path.join(directory, f"{prefix}_{key}.json")
+
+
+def load_json(path: str, version: int) -> dict | None:
+    """A JSON object written by save_json, or None if it is missing, unreadable or not at `version`."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and data.get("version") == version:
+            return data
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def save_json(path: str, data: dict, what: str) -> bool:
+    """Atomically write `data` so a crash never leaves a half-written file. Failures are printed and return False."""
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        print(f"⚠️  Could not save {what}: {e}")
+        return False
+
+
+def manifest_path(repo_path: str) -> str:
+    """Location of the persisted file manifest for a repo (kept outside the clone)."""
+    return repo_state_path(MANIFEST_DIR, "manifest", repo_path)
+
+
+def load_manifest(repo_path: str) -> dict:
+    """Load the {relative_path: entry} manifest from the last scan, or {} if missing."""
+    data = load_json(manifest_path(repo_path), MANIFEST_VERSION)
+    return data.get("files", {}) if data else {}
+
+
+def save_manifest(repo_path: str, files: dict):
+    save_json(manifest_path(repo_path), {"version": MANIFEST_VERSION, "files": files}, "manifest")
+
 
+def decode_content(head: bytes, size: int) -> str:
+    """The scanned text of a file from its first bytes (`size` is the whole file's)."""
+    content = head.decode("utf-8", errors="ignore").replace("\r\n", "\n")
+    if len(content) > MAX_FILE_CHARS or size > len(head):
+        content = content[:MAX_FILE_CHARS] + "\n...[TRUNCATED]"
+    return content
 
-def scan_directory(repo_path: str) -> tuple[str, int]:
-    """Scan a directory and return (code_content, file_count)."""
-    code_content = ""
-    file_count = 0
 
+def read_content(file_path: str, size: int) -> str:
+    """The scanned text of a file whose hash and line count are already known: only its head is read."""
+    with open(file_path, "rb") as f:
+        return decode_content(f.read(MAX_CONTENT_BYTES), size)
+
+
+def read_source_file(file_path: str) -> tuple[str, str, int]:
+    """
+    Read a file in fixed-size blocks and return (content, sha256, line_count).
+
+    The hash and line count cover the whole file, but only the first
+    MAX_CONTENT_BYTES are kept, so huge files never sit in memory whole.
+    """
+    digest = hashlib.sha256()
+    head = bytearray()
+    lines = 0
+    size = 0
+    last = b""
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(READ_BUFFER_BYTES)
+            if not block:
+                break
+            digest.update(block)
+            lines += block.count(b"\n")
+            size += len(block)
+            last = block[-1:]
+            if len(head) < MAX_CONTENT_BYTES:
+                head += block[:MAX_CONTENT_BYTES - len(head)]
+    if last and last != b"\n":
+        lines += 1
+
+    return decode_content(bytes(head), size), digest.hexdigest(), lines
+
+
+class FileChunk(NamedTuple):
+    """A contiguous slice of one file: [start, end) character offsets into its content."""
+    path: str
+    start: int
+    end: int
+    text: str
+
+
+class ChunkStore:
+    """Per-file chunks of a scanned repository, with its line counts and directory tree."""
+
+    def __init__(
+        self,
+        chunks: Iterable[FileChunk] = (),
+        line_counts: dict[str, int] | None = None,
+        tree: dict[str, list] | None = None,
+    ):
+        self.chunks: list[FileChunk] = list(chunks)
+        # Full (untruncated) line count of every scanned file, by relative path
+        self.line_counts = line_counts if line_counts is not None else {}
+        # Directory listings captured during the walk, by relative directory
+        self.tree = tree if tree is not None else {}
+        self.file_count = sum(1 for c in self.chunks if c.start == 0)
+        self.size_bytes = sum(len(c.text) for c in self.chunks)
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the store: chunks and their text, line counts and directory tree."""
+        size = sys.getsizeof(self.chunks) + sys.getsizeof(self.line_counts) + sys.getsizeof(self.tree)
+        size += sum(sys.getsizeof(c) + sys.getsizeof(c.text) for c in self.chunks)
+        # Chunk paths are the line_counts keys
+        size += sum(sys.getsizeof(path) + sys.getsizeof(lines) for path, lines in self.line_counts.items())
+        for directory, entries in self.tree.items():
+            size += sys.getsizeof(directory) + sys.getsizeof(entries)
+            size += sum(sys.getsizeof(entry) + sys.getsizeof(entry[0]) for entry in entries)
+        return size
+
+    def fingerprint(self) -> str:
+        """Hash of every scanned path and its content."""
+        digest = hashlib.sha256()
+        for chunk in self.chunks:
+            if chunk.start == 0:
+                digest.update(chunk.path.encode() + b"\0")
+            digest.update(chunk.text.encode())
+        return digest.hexdigest()
+
+
+def chunk_file(relative_path: str, content: str, size: int = CHUNK_CHARS) -> Iterator[FileChunk]:
+    """Split file content into chunks of at most `size` chars, preferring line boundaries."""
+    if not content:
+        yield FileChunk(relative_path, 0, 0, "")
+        return
+    start = 0
+    while start < len(content):
+        end = min(start + size, len(content))
+        if end < len(content):
+            newline = content.rfind("\n", start, end)
+            if newline > start:
+                end = newline + 1
+        yield FileChunk(relative_path, start, end, content[start:end])
+        start = end
+
+
+def walk_repo(repo_path: str, tree: dict[str, list] | None = None) -> list[tuple[str, str]]:
+    """
+    Return (file_path, relative_path) for every allowed file, in os.walk order.
+    Relative paths (and `tree` keys) use "/" on every platform.
+
+    If `tree` is given it is filled with the directory listing of every walked
+    directory ("" for the root): [name, is_dir] pairs, folders first.
+    """
+    found = []
     for root, dirs, files in os.walk(repo_path):
         # Filter out ignored directories in-place
         dirs[:] = [d for d in dirs if d not in IGNORE_DIRS]
 
+        if tree is not None:
+            relative_dir = os.path.relpath(root, repo_path).replace(os.sep, "/")
+            entries = [[d, True] for d in dirs] + [[f, False] for f in files]
+            entries.sort(key=lambda e: (not e[1], e[0].lower()))
+            tree["" if relative_dir == "." else relative_dir] = entries
+
         for file in files:
             ext = os.path.splitext(file)[1].lower()
             if ext in ALLOWED_EXTENSIONS or file in SPECIAL_FILES:
                 file_path = os.path.join(root, file)
-                relative_path = os.path.relpath(file_path, repo_path)
-                try:
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        content = f.read()
-                        if len(content) > 15000:
-                            content = content[:15000] + "\n...[TRUNCATED]"
+                found.append((file_path, os.path.relpath(file_path, repo_path).replace(os.sep, "/")))
+    return found
 
-                        code_content += f"\n\n--- FILE: {relative_path} ---\n"
-                        code_content += content
-                        file_count += 1
-                except Exception:
-                    pass
 
-    return code_content, file_count
+def iter_chunks(
+    repo_path: str,
+    line_counts: dict[str, int] | None = None,
+    tree: dict[str, list] | None = None,
+) -> Iterator[FileChunk]:
+    """
+    Walk a directory and yield the chunks of every allowed file.
 
+    Files are stat'ed and read on a thread pool; results are consumed in
+    walk order so output is deterministic. Files whose size and mtime match
+    the persisted manifest are not hashed or re-chunked: their text is read
+    back from the clone and cut at the recorded chunk offsets. Line counts
+    are recorded into `line_counts` and directory listings into `tree` if
+    given. The manifest is saved once the walk is exhausted.
 
-def clone_and_scan(repo_url: str) -> tuple[str, str | None]:
-    """Clone a GitHub repo or scan a local path, then return (code_content, repo_path)."""
+    A file's text is only held by its chunks: the manifests carry metadata
+    alone, and entries of the previous one are dropped as they are matched.
+    """
+    previous = load_manifest(repo_path)
+    manifest = {}
+    reused = 0
+    changed = False
+
+    def load(item):
+        file_path, relative_path = item
+        try:
+            st = os.stat(file_path)
+            entry = previous.pop(relative_path, None)
+            if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns:
+                content = read_content(file_path, st.st_size)
+                ends = entry["chunks"]
+                if len(content) == ends[-1]:
+                    starts = [0] + ends[:-1]
+                    chunks = [FileChunk(relative_path, a, b, content[a:b]) for a, b in zip(starts, ends)]
+                    return relative_path, entry, chunks, True
+            content, digest, lines = read_source_file(file_path)
+        except Exception:
+            return relative_path, None, None, False
+        chunks = list(chunk_file(relative_path, content))
+        entry = {
+            "size": st.st_size,
+            "mtime": st.st_mtime_ns,
+            "sha256": digest,
+            "lines": lines,
+            # End offset of each chunk in the file's scanned text; the last one is its length
+            "chunks": [c.end for c in chunks],
+        }
+        return relative_path, entry, chunks, False
+
+    with ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest") as pool:
+        for relative_path, entry, chunks, was_reused in pool.map(load, walk_repo(repo_path, tree)):
+            if entry is None:
+                continue
+            reused += was_reused
+            changed = changed or not was_reused
+            manifest[relative_path] = entry
+            if line_counts is not None:
+                line_counts[relative_path] = entry["lines"]
+            yield from chunks
+
+    # Whatever is left of the previous manifest was deleted (or became unreadable) since the last scan
+    if changed or previous:
+        save_manifest(repo_path, manifest)
+    if reused:
+        print(f"⚡ Reused {reused}/{len(manifest)} unchanged files from manifest.")
+
+
+def scan_directory(repo_path: str) -> ChunkStore:
+    """Scan a directory into a ChunkStore (chunks, per-file line counts and directory tree) in one pass."""
+    line_counts = {}
+    tree = {}
+    with STAGE_SECONDS.time(stage="scan_directory"):
+        return ChunkStore(iter_chunks(repo_path, line_counts, tree), line_counts, tree)
+
+
+def language_stats(line_counts: dict[str, int]) -> tuple[int, int, Counter]:
+    """Return (source_files, total_lines, lines_per_language) for files with a known language."""
+    total_files = 0
+    total_lines = 0
+    languages = Counter()
+    for relative_path, lines in line_counts.items():
+        lang = LANGUAGE_MAP.get(os.path.splitext(relative_path)[1].lower())
+        if lang:
+            total_files += 1
+            total_lines += lines
+            languages[lang] += lines
+    return total_files, total_lines, languages
+
+
+def repo_revision(repo_path: str, store: ChunkStore) -> str:
+    """
+    Identify the scanned state of a repo: the HEAD commit SHA when tracked
+    files are unmodified, otherwise a fingerprint of the scanned content.
+    """
+    try:
+        repo = git.Repo(repo_path)
+        if not repo.is_dirty(untracked_files=False):
+            return repo.head.commit.hexsha
+    except Exception:
+        pass
+    return f"content-{store.fingerprint()}"
+
+
+def run_git(*args: str, timeout: float | None = CLONE_TIMEOUT) -> str:
+    """Run a git command and return its stdout; raises RuntimeError with git's message on failure."""
+    try:
+        result = subprocess.run(["git", *args], capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"git {args[0]} timed out after {timeout}s")
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"git {args[0]} failed")
+    return result.stdout
+
+
+def sparse_patterns() -> list[str]:
+    """Non-cone sparse-checkout patterns selecting exactly the files the scanner reads."""
+    patterns = [f"*{ext}" for ext in sorted(ALLOWED_EXTENSIONS)] + sorted(SPECIAL_FILES)
+    return patterns + [f"!**/{d}/**" for d in sorted(IGNORE_DIRS)]
+
+
+def clone_repo(
+    repo_url: str,
+    repo_path: str,
+    depth: int = CLONE_DEPTH,
+    blob_filter: str = CLONE_FILTER,
+    sparse: bool = CLONE_SPARSE,
+):
+    """
+    Clone `repo_url` into `repo_path` using the configured strategy.
+
+    A blobless filter downloads commits and trees up front and only the file
+    contents the checkout needs, which keeps later history walks (git
+    insights) cheap. Sparse checkout additionally skips files the scanner
+    would ignore.
+    """
+    command = ["clone", "--quiet"]
+    if depth:
+        command += ["--depth", str(depth)]
+    if blob_filter:
+        command.append(f"--filter={blob_filter}")
+    if sparse:
+        command.append("--no-checkout")
+    with STAGE_SECONDS.time(stage="clone"):
+        run_git(*command, repo_url, repo_path)
+        if sparse:
+            run_git("-C", repo_path, "sparse-checkout", "set", "--no-cone", *sparse_patterns())
+            run_git("-C", repo_path, "checkout", "--quiet")
+
+
+def clone_path(repo_url: str) -> str:
+    """Where a remote repo is cloned: a persistent, predictable folder named by a hash of its URL."""
+    url_hash = hashlib.sha256(repo_url.encode()).hexdigest()[:12]
+    return os.path.join(BASE_DIR, f"repo_{url_hash}")
+
+
+def is_managed_clone(repo_path: str | None) -> bool:
+    """True for clones this service owns under BASE_DIR (never for user-supplied local paths)."""
+    return bool(repo_path) and os.path.dirname(os.path.abspath(repo_path)) == BASE_DIR and os.path.basename(repo_path).startswith("repo_")
+
+
+def last_fetch_time(repo_path: str) -> float:
+    """When the clone last talked to its remote: the last fetch, or the clone itself."""
+    for name in ("FETCH_HEAD", "HEAD"):
+        try:
+            return os.path.getmtime(os.path.join(repo_path, ".git", name))
+        except OSError:
+            continue
+    return 0.0
+
+
+def fetch_updates(repo_path: str) -> str | None:
+    """
+    Fetch the clone's upstream branch. Returns the upstream commit if it
+    differs from HEAD, else None. Raises RuntimeError if git fails.
+    """
+    with STAGE_SECONDS.time(stage="fetch"):
+        run_git("-C", repo_path, "fetch", "--quiet", "origin")
+    head = run_git("-C", repo_path, "rev-parse", "HEAD").strip()
+    upstream = run_git("-C", repo_path, "rev-parse", "@{upstream}").strip()
+    return upstream if upstream != head else None
+
+
+def checkout_revision(repo_path: str, revision: str):
+    """Move the clone's branch and working tree to `revision` (sparse patterns still apply)."""
+    run_git("-C", repo_path, "reset", "--hard", "--quiet", revision)
+
+
+def ensure_clone(repo_url: str) -> tuple[str | None, str | None]:
+    """
+    Make sure a repo is on disk: clone a GitHub repo if it isn't yet, or
+    resolve a local path. Returns (repo_path, None), or (None, error_message).
+    """
 
     # Handle local directory paths
     if repo_url.startswith("/") or repo_url.startswith("~") or repo_url.startswith("./"):
         local_path = os.path.expanduser(repo_url)
         if os.path.isdir(local_path):
-            print(f"📂 Scanning local directory: {local_path}")
-            code_content, file_count = scan_directory(local_path)
-            print(f"✅ Scanned {file_count} files from local path.")
-            return code_content, local_path
-        else:
-            return "Error: Local path not found.", None
+            return local_path, None
+        return None, "Error: Local path not found."
 
     if not os.path.exists(BASE_DIR):
         os.makedirs(BASE_DIR)
 
-    # Use a hash of the URL for a persistent, predictable folder name
-    url_hash = hashlib.sha256(repo_url.encode()).hexdigest()[:12]
-    repo_path = os.path.join(BASE_DIR, f"repo_{url_hash}")
+    repo_path = clone_path(repo_url)
 
     if os.path.exists(repo_path):
         print(f"♻️  Using cached repository: {repo_path}")
     else:
         print(f"⬇️  Cloning into: {repo_path}...")
         try:
-            # depth=50 is a good balance for speed vs git history analysis
-            git.Repo.clone_from(repo_url, repo_path, depth=50) 
+            started = time.perf_counter()
+            clone_repo(repo_url, repo_path)
+            print(f"⬇️  Cloned in {time.perf_counter() - started:.1f}s")
         except Exception as e:
             if os.path.exists(repo_path):
                  shutil.rmtree(repo_path, onerror=handle_remove_readonly)
-            return f"Git Clone Error: {e}", None
+            return None, f"Git Clone Error: {e}"
+    return repo_path, None
+
+
+def clone_and_scan(repo_url: str) -> tuple[ChunkStore | str, str | None]:
+    """
+    Clone a GitHub repo or scan a local path, then return (chunk_store, repo_path).
+    On failure returns (error_message, None).
+
+    An existing clone is scanned as-is; keeping it current is left to a
+    background refresh (see ContextStore) so requests never wait on a fetch.
+    """
+    repo_path, error = ensure_clone(repo_url)
+    if repo_path is None:
+        return error, None
+
+    if not is_managed_clone(repo_path):
+        print(f"📂 Scanning local directory: {repo_path}")
+        store = scan_directory(repo_path)
+        print(f"✅ Scanned {store.file_count} files from local path.")
+        return store, repo_path
 
-    code_content, file_count = scan_directory(repo_path)
-    print(f"✅ Scanned {file_count} files.")
-    return code_content, repo_path
\ No newline at end of file
+    store = scan_directory(repo_path)
+    print(f"✅ Scanned {store.file_count} files.")
+    return store, repo_path
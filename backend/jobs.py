@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+import uuid
+from contextlib import nullcontext
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+
+
+class Job:
+    """One submitted analysis; `update()` publishes progress to pollers and subscribers."""
+
+    def __init__(self, kind: str, key: tuple):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"
+        self.progress = 0
+        self.message = "Queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # Bumped on every change so subscribers can tell when to emit
+        self.version = 0
+        self.task: asyncio.Task | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def update(self, progress: int, message: str):
+        self.progress = progress
+        self.message = message
+        self.version += 1
+
+    def to_dict(self, include_result: bool = True) -> dict:
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if include_result and self.done:
+            data["result"] = self.result
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    """
+    Runs analysis coroutines in the background on a bounded worker pool.
+
+    Submitting work that is identical to a queued or running job (same kind
+    and key) returns that job instead of starting a second one. Finished
+    jobs are kept for JOB_RESULT_TTL seconds so clients can collect them.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, result_ttl: float = JOB_RESULT_TTL):
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self.jobs: dict[str, Job] = {}
+        self._in_flight: dict[tuple, Job] = {}
+        self._slots: asyncio.Semaphore | None = None
+        self._loop = None
+        self.submitted = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def _ensure_slots(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.workers)
+            self._loop = loop
+
+    def submit(self, kind: str, key: tuple, fn, *args, pooled: bool = True) -> Job:
+        """
+        Schedule `await fn(job, *args)` unless an identical job is already in
+        flight. Jobs that other jobs wait on pass pooled=False and run
+        outside the worker pool, so their waiters can't starve them of a slot.
+        """
+        self._ensure_slots()
+        self._prune()
+        full_key = (kind,) + key
+        job = self._in_flight.get(full_key)
+        if job is not None:
+            self.coalesced += 1
+            return job
+
+        job = Job(kind, full_key)
+        self.jobs[job.id] = job
+        self._in_flight[full_key] = job
+        self.submitted += 1
+        job.task = asyncio.ensure_future(self._run(job, fn, args, self._slots if pooled else nullcontext()))
+        return job
+
+    async def _run(self, job: Job, fn, args, slot):
+        try:
+            async with slot:
+                job.status = "running"
+                job.started = time.time()
+                job.update(1, "Started")
+                job.result = await fn(job, *args)
+                job.status = "done"
+                job.update(100, "Done")
+        except Exception as e:
+            print(f"Job {job.kind} failed: {e}")
+            self.failed += 1
+            job.error = str(e)
+            job.status = "failed"
+            job.update(job.progress, "Failed")
+        finally:
+            job.finished = time.time()
+            self._in_flight.pop(job.key, None)
+        return job.result
+
+    async def wait(self, job: Job):
+        """Wait for a job's result; cancelling the waiter never cancels the shared job."""
+        await asyncio.shield(job.task)
+        if job.status == "failed":
+            raise RuntimeError(job.error)
+        return job.result
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [j.id for j in self.jobs.values() if j.done and j.finished < cutoff]:
+            del self.jobs[job_id]
+
+    def stats(self) -> dict:
+        statuses = [j.status for j in self.jobs.values()]
+        return {
+            "workers": self.workers,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "retained": len(statuses),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+        }
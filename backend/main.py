@@ -1,23 +1,37 @@
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, field_validator
-import requests
-from ingest import clone_and_scan
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+from context_store import ContextStore, RepoContext
+from context_packer import context_budget
+from retrieval import estimate_tokens
+from summarizer import SUMMARY_MIN_BYTES, SUMMARY_PROMPT_VERSION, RepoSummarizer
+from workspace import CloneEvicted, WorkspaceManager
+import metrics
+from metrics import CONTEXT_TOKENS, HTTP_SECONDS
+from repo_index import STRUCTURE_DEPTH, STRUCTURE_PAGE_SIZE
+from retrieval import CHAT_CONTEXT_TOKENS
+from ollama_client import OllamaClient
+from analysis_cache import AnalysisCache
+from jobs import Job, JobManager
+from batch import BATCH_IN_FLIGHT, BATCH_MAX_REPOS, StageLimiter, run_bounded
+from ingest import clone_path, ensure_clone
+from git_history import mine_insights
 import os
-import git
 import subprocess
 from dotenv import load_dotenv
 import json
+import asyncio
+import time
 import warnings
 import re
 from datetime import datetime
-from collections import Counter, defaultdict
-from threading import Lock
+from contextlib import asynccontextmanager
 
-from security.bandit_analyzer import run_bandit_analysis
-from security.detect_secrets_analyzer import run_detect_secrets_analysis
-from security.safety_analyzer import run_safety_analysis
+from security.pipeline import run_security_tools
+from security.bandit_analyzer import ENGINE as BANDIT
+from security.advisories import ADVISORIES
 
 warnings.filterwarnings("ignore")
 load_dotenv()
@@ -27,7 +41,33 @@ venv_bin = os.path.join(os.path.dirname(__file__), "venv", "bin")
 if os.path.exists(venv_bin):
     os.environ["PATH"] = venv_bin + os.pathsep + os.environ.get("PATH", "")
 
-app = FastAPI(title="DevMind AI API", version="1.0.0")
+# --- GLOBAL STATE ---
+WORKSPACE = WorkspaceManager()
+CONTEXT_STORE = ContextStore(workspace=WORKSPACE)
+# Contexts of evicted clones point at deleted files; drop them so the next request re-clones
+WORKSPACE.on_evict = CONTEXT_STORE.invalidate
+OLLAMA = OllamaClient()
+ANALYSIS_CACHE = AnalysisCache()
+JOBS = JobManager()
+SUMMARIZER = RepoSummarizer(OLLAMA, ANALYSIS_CACHE)
+BATCH_STAGES = StageLimiter()
+
+# Bump an endpoint's version whenever its prompt or result shape changes
+PROMPT_VERSIONS = {
+    "overview": 3,
+    "security": 2,
+    "quality": 3,
+    "git_insights": 4,
+}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await OLLAMA.aclose()
+
+
+app = FastAPI(title="DevMind AI API", version="1.0.0", lifespan=lifespan)
 
 # CORS - configurable via environment variable
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "*").split(",")
@@ -38,13 +78,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- GLOBAL STATE ---
-CURRENT_CODE_CONTEXT = ""
-CURRENT_REPO_URL = ""
-CURRENT_REPO_PATH = ""
-CONTEXT_LOCK = Lock()
-AI_LOCK = Lock()
-ANALYSIS_CACHE = {}
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (e.g. /api/jobs/{job_id}) to keep label values bounded
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status,
+        )
 
 
 def is_valid_github_url(url: str) -> bool:
@@ -55,52 +105,114 @@ def is_local_path(url: str) -> bool:
     return url.startswith("/") or url.startswith("./") or url.startswith("~")
 
 
-def ensure_context(url: str):
-    global CURRENT_CODE_CONTEXT, CURRENT_REPO_URL, CURRENT_REPO_PATH
+def ensure_context(url: str) -> RepoContext:
+    """Return the cached context for a repo, cloning and scanning it on a miss."""
+    return CONTEXT_STORE.get(url)
 
-    with CONTEXT_LOCK:
-        if url != CURRENT_REPO_URL or not CURRENT_CODE_CONTEXT:
-            # check again in case another thread just finished it
-            if url == CURRENT_REPO_URL and CURRENT_CODE_CONTEXT:
-                 return CURRENT_CODE_CONTEXT
-                 
-            print(f"🔄 Switching context to: {url}")
-            code, path = clone_and_scan(url)
-    
-            if path is None:
-                print("❌ Clone failed!")
-                CURRENT_CODE_CONTEXT = "Error: Repository could not be cloned."
-                CURRENT_REPO_PATH = ""
-            else:
-                CURRENT_CODE_CONTEXT = code
-                CURRENT_REPO_PATH = path
-                CURRENT_REPO_URL = url
-    
-    return CURRENT_CODE_CONTEXT
 
+async def ai_generate(prompt: str, is_json: bool = False, request: Request | None = None):
+    """
+    Call Ollama through the shared pooled client. Concurrency is bounded by
+    OLLAMA_NUM_PARALLEL; passing the incoming request cancels the generation
+    if that client disconnects. Returns None on failure.
+    """
+    return await OLLAMA.generate(prompt, is_json=is_json, request=request)
+
+
+async def in_stage(stages: StageLimiter | None, stage: str, awaitable):
+    """Await `awaitable` holding a slot of a batch `stage`; outside batches (`stages` is None) just await it."""
+    if stages is None:
+        return await awaitable
+    async with stages.slot(stage):
+        return await awaitable
+
+
+def analysis_key(endpoint: str, ctx: RepoContext) -> str:
+    revision = ctx.revision or f"unloaded:{ctx.url}"
+    return ANALYSIS_CACHE.make_key(endpoint, revision, PROMPT_VERSIONS[endpoint], OLLAMA.model)
+
+
+def prompt_context(ctx: RepoContext, output_tokens: int = 1024) -> str:
+    """The repo's key files, packed to fit the model's window next to an answer of `output_tokens`."""
+    context = ctx.packed(context_budget(OLLAMA.model, output_tokens))
+    CONTEXT_TOKENS.observe(estimate_tokens(context), kind="packed")
+    return context
+
+
+# Repo summaries are sized for the largest answer any analysis asks for, so one summary serves them all
+SUMMARY_OUTPUT_TOKENS = 2048
+
+
+def wants_summary(ctx: RepoContext) -> bool:
+    """Whether the repo is too large for its packed key files to stand for it."""
+    if not ctx.ok or not ctx.revision:
+        return False
+    return ctx.store.size_bytes > max(SUMMARY_MIN_BYTES, context_budget(OLLAMA.model, SUMMARY_OUTPUT_TOKENS) * 3)
+
+
+def summary_key(ctx: RepoContext) -> str:
+    return ANALYSIS_CACHE.make_key("repo_summary", ctx.revision, SUMMARY_PROMPT_VERSION, OLLAMA.model)
+
+
+async def compute_summary(ctx: RepoContext, progress=None) -> str:
+    """The repo's map-reduce summary for its current revision, computed on a cache miss."""
+    key = summary_key(ctx)
+    summary = await run_in_threadpool(ANALYSIS_CACHE.get, key)
+    if summary is None:
+        budget = context_budget(OLLAMA.model, SUMMARY_OUTPUT_TOKENS)
+        summary = await SUMMARIZER.summarize(ctx.store.chunks, budget // 2, progress)
+        if summary:
+            await run_in_threadpool(ANALYSIS_CACHE.set, key, summary)
+    return summary
+
+
+async def summary_job(job: Job, repo_url: str):
+    """Compute a large repo's summary once for every request and analysis that needs it."""
+    ctx = await run_in_threadpool(ensure_context, repo_url)
+    if not wants_summary(ctx):
+        return None
+    return await compute_summary(ctx, progress=lambda done, total: job.update(5 + 90 * done // total, f"Summarized {done}/{total} file batches"))
+
+
+def start_summary(ctx: RepoContext) -> Job:
+    """
+    The repo's summary job, shared by everyone who needs the summary. It
+    runs outside the worker pool: the analyses waiting on it hold slots.
+    """
+    return JOBS.submit("summary", (ctx.url,), summary_job, ctx.url, pooled=False)
+
+
+async def cached_summary(ctx: RepoContext) -> str | None:
+    """The repo's summary if it is already computed; otherwise start computing it in the background."""
+    summary = await run_in_threadpool(ANALYSIS_CACHE.get, summary_key(ctx))
+    if summary is None:
+        start_summary(ctx)
+    return summary
 
-def ai_generate(prompt: str, is_json: bool = False):
-    """Helper to call Ollama via local REST API with sequential locking."""
-    with AI_LOCK:
-        try:
-            payload = {
-                "model": "llama3.1:8b",
-                "prompt": prompt,
-                "stream": False
-            }
-            if is_json:
-                payload["format"] = "json"
-    
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json=payload,
-                timeout=180
-            )
-            response.raise_for_status()
-            return response.json().get("response")
-        except Exception as e:
-            print(f"Ollama error: {e}")
-            return None
+
+async def repo_context(ctx: RepoContext, output_tokens: int = 1024, wait: bool = False) -> tuple[str, bool]:
+    """
+    Prompt context for whole-repo analyses. When the repo is larger than one
+    prompt, a map-reduce summary of all its files is placed before the
+    packed key files, so the model sees more than the first few files.
+    Returns (context, complete): complete is False when the repo wanted a
+    summary but the context holds only the packed key files.
+
+    Background jobs pass `wait=True` and wait for the summary job (once per
+    revision, then cached). Interactive and streaming callers never wait
+    on dozens of model calls: until the summary is cached they get the
+    packed key files, and the summary job is started in the background.
+    """
+    if not wants_summary(ctx):
+        return prompt_context(ctx, output_tokens), True
+    summary = await JOBS.wait(start_summary(ctx)) if wait else await cached_summary(ctx)
+    if not summary:
+        return prompt_context(ctx, output_tokens), False
+    budget = context_budget(OLLAMA.model, output_tokens)
+    summary_tokens = estimate_tokens(summary)
+    key_files = ctx.packed(max(budget - summary_tokens, 256))
+    CONTEXT_TOKENS.observe(summary_tokens + estimate_tokens(key_files), kind="summarized")
+    return f"Repository summary (covers all files):\n{summary}\n\nKey files:{key_files}", True
 
 
 # --- MODELS ---
@@ -115,6 +227,13 @@ class OverviewRequest(BaseModel):
         return v.strip()
 
 
+class StructureRequest(OverviewRequest):
+    path: str = ""
+    depth: int = Field(STRUCTURE_DEPTH, ge=1, le=32)
+    offset: int = Field(0, ge=0)
+    limit: int = Field(STRUCTURE_PAGE_SIZE, ge=1, le=5000)
+
+
 class SecurityRequest(BaseModel):
     repo_url: str
 
@@ -163,6 +282,36 @@ class GitInsightsRequest(BaseModel):
     repo_url: str
 
 
+class BatchRequest(BaseModel):
+    repo_urls: list[str]
+    kinds: list[str] = ["security"]
+    framework: str = "auto"
+
+    @field_validator("repo_urls")
+    @classmethod
+    def validate_urls(cls, v):
+        # Each repo is analyzed once, in the order given
+        urls = list(dict.fromkeys(u.strip() for u in v if u and u.strip()))
+        if not urls:
+            raise ValueError("At least one repository URL is required")
+        if len(urls) > BATCH_MAX_REPOS:
+            raise ValueError(f"At most {BATCH_MAX_REPOS} repositories per batch")
+        return urls
+
+
+class JobRequest(BaseModel):
+    kind: str
+    repo_url: str
+    framework: str = "auto"
+
+    @field_validator("repo_url")
+    @classmethod
+    def validate_url(cls, v):
+        if not v or not v.strip():
+            raise ValueError("URL cannot be empty")
+        return v.strip()
+
+
 # --- ROUTES ---
 
 
@@ -176,116 +325,108 @@ def health_check():
     }
 
 
-@app.post("/structure")
-def get_project_structure(request: OverviewRequest):
-    ensure_context(request.url)
-    repo_path = CURRENT_REPO_PATH
+@app.get("/api/stats")
+def get_stats():
+    return {
+        "context_store": CONTEXT_STORE.stats(),
+        "ollama": OLLAMA.stats(),
+        "analysis_cache": ANALYSIS_CACHE.stats(),
+        "jobs": JOBS.stats(),
+        "workspace": WORKSPACE.stats(),
+        "file_results_cache": BANDIT.cache.stats(),
+        "bandit": BANDIT.stats(),
+        "advisories": ADVISORIES.stats(),
+        "batch": BATCH_STAGES.stats(),
+    }
 
-    if not repo_path or not os.path.exists(repo_path):
-        return {"structure": [{"name": "Error: Repo not found", "type": "file"}]}
 
-    ignore_dirs = {
-        ".git",
-        "node_modules",
-        "__pycache__",
-        "dist",
-        "build",
-        "venv",
-        ".idea",
-        ".vscode",
-        ".mypy_cache",
-        ".pytest_cache",
-        "coverage",
-        ".next",
-    }
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text format: stage/Ollama/HTTP histograms plus the /api/stats counters as gauges."""
+    cache_stats = ANALYSIS_CACHE.stats()
+    file_cache_stats = BANDIT.cache.stats()
+    lookups = [
+        ({"endpoint": endpoint, "result": result}, counts[result])
+        for stats in (cache_stats, file_cache_stats)
+        for endpoint, counts in stats.pop("by_endpoint").items()
+        for result in ("hits", "misses")
+    ]
+    body = metrics.render(
+        {
+            "context_store": CONTEXT_STORE.stats(),
+            "ollama": OLLAMA.stats(),
+            "analysis_cache": cache_stats,
+            "file_results_cache": file_cache_stats,
+            "jobs": JOBS.stats(),
+            "workspace": WORKSPACE.stats(),
+            "bandit": BANDIT.stats(),
+            "advisories": ADVISORIES.stats(),
+            "batch": BATCH_STAGES.stats(),
+        }
+    )
+    body += "\n".join(
+        metrics.render_gauges("devmind_analysis_cache_lookups", "Analysis cache lookups by endpoint and result", lookups)
+    )
+    return PlainTextResponse(body + "\n", media_type="text/plain; version=0.0.4")
 
-    def build_tree(path):
-        name = os.path.basename(path)
-        item = {"name": name, "type": "file"}
 
-        if os.path.isdir(path):
-            item["type"] = "folder"
-            item["children"] = []
-            try:
-                for entry in sorted(
-                    os.scandir(path), key=lambda e: (not e.is_dir(), e.name.lower())
-                ):
-                    if entry.name in ignore_dirs:
-                        continue
-                    item["children"].append(build_tree(entry.path))
-            except PermissionError:
-                pass
-        return item
+@app.post("/structure")
+def get_project_structure(request: StructureRequest):
+    """
+    One page of the project tree under `path`, expanded `depth` levels.
+    Folders below that carry `child_count` and are loaded by requesting their `path`.
+    """
+    ctx = ensure_context(request.url)
 
-    tree = build_tree(repo_path)
-    return {"structure": tree.get("children", [])}
+    if not ctx.ok:
+        return {"structure": [{"name": "Error: Repo not found", "type": "file"}]}
 
+    path = request.path.strip("/")
+    if not ctx.repo_index.has_dir(path):
+        raise HTTPException(status_code=404, detail=f"Directory not found: {path}")
 
-@app.post("/api/analyze-security")
-def analyze_security(request: SecurityRequest):
-    context = ensure_context(request.repo_url)
-    if "Error:" in context[:100]:
+    return ctx.repo_index.subtree(path, request.depth, request.offset, request.limit)
+
+
+async def security_job(job: Job, repo_url: str, stages: StageLimiter | None = None):
+    job.update(5, "Loading repository")
+    ctx = await run_in_threadpool(ensure_context, repo_url)
+    if not ctx.ok:
         return {"issues": []}
 
-    cache_key = f"security_{request.repo_url}"
-    if cache_key in ANALYSIS_CACHE:
+    cache_key = analysis_key("security", ctx)
+    cached = await run_in_threadpool(ANALYSIS_CACHE.get, cache_key)
+    if cached is not None:
         print("🛡️  Returning Cached Security Analysis...")
-        return ANALYSIS_CACHE[cache_key]
+        return cached
 
     print("🛡️  Running Security Analysis...")
+    job.update(20, "Running security scanners and AI review")
 
-    bandit_issues = []
-    if CURRENT_REPO_PATH and os.path.exists(CURRENT_REPO_PATH):
-        bandit_issues_raw = run_bandit_analysis(CURRENT_REPO_PATH)
-        for issue in bandit_issues_raw:
-            bandit_issues.append(
-                {
-                    "severity": issue["severity"],
-                    "title": f"Bandit: {issue['title']}",
-                    "location": issue["location"],
-                    "description": f"{issue['description']} (Confidence: {issue['confidence']})",
-                }
-            )
-
-    secrets_issues = []
-    if CURRENT_REPO_PATH and os.path.exists(CURRENT_REPO_PATH):
-        secrets_issues_raw = run_detect_secrets_analysis(CURRENT_REPO_PATH)
-        for issue in secrets_issues_raw:
-            secrets_issues.append(
-                {
-                    "severity": issue["severity"],
-                    "title": f"Secret: {issue['title']}",
-                    "location": issue["location"],
-                    "description": issue["description"],
-                }
-            )
-
-    safety_issues = []
-    if CURRENT_REPO_PATH and os.path.exists(CURRENT_REPO_PATH):
-        safety_issues_raw = run_safety_analysis(CURRENT_REPO_PATH)
-        for issue in safety_issues_raw:
-            safety_issues.append(
-                {
-                    "severity": issue["severity"],
-                    "title": f"Safety: {issue['title']}",
-                    "location": issue["location"],
-                    "description": issue["description"],
-                }
-            )
-
-    ai_issues = []
     prompt = f"""
     You are a Senior Security Engineer. Analyze the codebase below for security vulnerabilities.
     Focus on: Hardcoded secrets, SQL injection, XSS, CSRF, insecure deserialization, dangerous dependencies.
 
     CODEBASE CONTEXT:
-    {context[:5000]}
+    {prompt_context(ctx)}
 
     Return ONLY a JSON object with a key "issues" containing a list.
     Each item must have: "severity" (CRITICAL, HIGH, MEDIUM, LOW), "title", "location", and "description".
     Return at most 10 AI-detected issues. If none found, return {{"issues": []}}.
     """
-    raw = ai_generate(prompt, is_json=True)
+
+    # The scanners and the AI pass are independent, so run them side by side
+    with WORKSPACE.lease(ctx.path):
+        (tool_issues, failed_tools), raw = await asyncio.gather(
+            in_stage(stages, "security", run_in_threadpool(run_security_tools, ctx.path)),
+            in_stage(stages, "llm", ai_generate(prompt, is_json=True)),
+        )
+    if ctx.path and not os.path.isdir(ctx.path):
+        # The scanners found nothing to scan; an AI-only report must not be cached as the revision's result
+        raise RuntimeError("Repository checkout disappeared during the security scan")
+    job.update(90, "Writing security report")
+
+    ai_issues = []
     if raw:
         try:
             json_str = raw.replace("```json", "").replace("```", "").strip()
@@ -293,11 +434,11 @@ def analyze_security(request: SecurityRequest):
         except Exception:
             pass
 
-    all_issues = bandit_issues + secrets_issues + safety_issues + ai_issues
+    all_issues = tool_issues + ai_issues
 
-    if all_issues and CURRENT_REPO_PATH:
+    if all_issues and ctx.path:
         report_markdown = generate_security_report_markdown(all_issues)
-        report_path = os.path.join(CURRENT_REPO_PATH, "SECURITY_REPORT.md")
+        report_path = os.path.join(ctx.path, "SECURITY_REPORT.md")
         try:
             with open(report_path, "w") as f:
                 f.write(report_markdown)
@@ -305,74 +446,51 @@ def analyze_security(request: SecurityRequest):
             pass
 
     result = {"issues": all_issues}
-    ANALYSIS_CACHE[cache_key] = result
+    if failed_tools:
+        # Missing or stale findings from a tool: serve this report, but scan again next time
+        result["failed_tools"] = failed_tools
+    else:
+        await run_in_threadpool(ANALYSIS_CACHE.set, cache_key, result)
     return result
 
 
-@app.post("/overview-fast")
-def get_fast_overview(request: OverviewRequest):
-    """Return instant file stats without calling AI. Responds in <100ms."""
-    context = ensure_context(request.url)
-    repo_path = CURRENT_REPO_PATH
+async def job_result(job: Job):
+    """A synchronous endpoint's answer: the job's result, or its error as an HTTP 500."""
+    try:
+        return await JOBS.wait(job)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    if not repo_path or not os.path.exists(repo_path):
-        return {"total_files": 0, "total_lines": 0, "languages": {}, "complexity": "Unknown"}
 
-    ignore_dirs = {".git", "node_modules", "__pycache__", "dist", "build", "venv",
-                   ".idea", ".vscode", ".mypy_cache", ".pytest_cache", "coverage", ".next"}
+@app.post("/api/analyze-security")
+async def analyze_security(request: SecurityRequest):
+    job = JOBS.submit("security", (request.repo_url,), security_job, request.repo_url)
+    return await job_result(job)
 
-    lang_map = {
-        ".py": "Python", ".js": "JavaScript", ".ts": "TypeScript", ".tsx": "TypeScript",
-        ".jsx": "JavaScript", ".java": "Java", ".cpp": "C++", ".c": "C", ".h": "C/C++",
-        ".go": "Go", ".rs": "Rust", ".rb": "Ruby", ".html": "HTML", ".css": "CSS",
-        ".scss": "SCSS", ".json": "JSON", ".md": "Markdown", ".yml": "YAML",
-        ".yaml": "YAML", ".sql": "SQL", ".sh": "Shell", ".vue": "Vue",
-        ".svelte": "Svelte", ".xml": "XML", ".toml": "TOML", ".graphql": "GraphQL",
-    }
 
-    total_files = 0
-    total_lines = 0
-    languages = Counter()
-
-    for root, dirs, files in os.walk(repo_path):
-        dirs[:] = [d for d in dirs if d not in ignore_dirs]
-        for f in files:
-            ext = os.path.splitext(f)[1].lower()
-            if ext in lang_map:
-                total_files += 1
-                lang = lang_map[ext]
-                try:
-                    fp = os.path.join(root, f)
-                    with open(fp, "r", encoding="utf-8", errors="ignore") as fh:
-                        lines = sum(1 for _ in fh)
-                        total_lines += lines
-                        languages[lang] += lines
-                except Exception:
-                    pass
-
-    complexity = "Low" if total_lines < 5000 else "Medium" if total_lines < 20000 else "High"
-
-    # Top languages by line count
-    top_langs = dict(languages.most_common(8))
+@app.post("/overview-fast")
+def get_fast_overview(request: OverviewRequest):
+    """Return instant file stats without calling AI, from the index built at ingest."""
+    ctx = ensure_context(request.url)
 
-    return {
-        "total_files": total_files,
-        "total_lines": total_lines,
-        "languages": top_langs,
-        "complexity": complexity,
-    }
+    if not ctx.ok:
+        return {"total_files": 0, "total_lines": 0, "languages": {}, "complexity": "Unknown"}
+
+    return ctx.repo_index.overview
 
 
 @app.post("/overview")
-def get_repo_overview(request: OverviewRequest):
-    context = ensure_context(request.url)
+async def get_repo_overview(request: OverviewRequest, http_request: Request):
+    ctx = await run_in_threadpool(ensure_context, request.url)
 
-    cache_key = f"overview_{request.url}"
-    if cache_key in ANALYSIS_CACHE:
+    cache_key = analysis_key("overview", ctx)
+    cached = await run_in_threadpool(ANALYSIS_CACHE.get, cache_key)
+    if cached is not None:
         print("📊 Returning Cached Overview...")
-        return ANALYSIS_CACHE[cache_key]
+        return cached
 
     print("📊 Generating Overview...")
+    codebase, complete = await repo_context(ctx, output_tokens=512)
     prompt = f"""Analyze this codebase. Return JSON:
 {{
     "description": "2-3 sentence summary",
@@ -380,14 +498,16 @@ def get_repo_overview(request: OverviewRequest):
     "key_features": ["feature1", "feature2"]
 }}
 Codebase:
-{context[:3000]}
+{codebase}
 Return ONLY valid JSON."""
 
-    raw = ai_generate(prompt, is_json=True)
+    raw = await ai_generate(prompt, is_json=True, request=http_request)
     if raw:
         try:
             result = json.loads(raw.replace("```json", "").replace("```", "").strip())
-            ANALYSIS_CACHE[cache_key] = result
+            # Built from the key files alone while the summary is still being computed: answer, but don't keep it
+            if complete:
+                await run_in_threadpool(ANALYSIS_CACHE.set, cache_key, result)
             return result
         except Exception:
             pass
@@ -398,60 +518,104 @@ Return ONLY valid JSON."""
     }
 
 
-@app.post("/chat")
-def chat_with_repo(request: ChatRequest):
-    context = ensure_context(request.repo_url)
-    print(f"💬 Chatting: {request.message[:50]}...")
-
-    prompt = f"""You are an expert code assistant that has fully analyzed a codebase.
+def build_chat_prompt(ctx: RepoContext, message: str) -> str:
+    context = ctx.relevant(message, min(CHAT_CONTEXT_TOKENS, context_budget(OLLAMA.model)))
+    CONTEXT_TOKENS.observe(estimate_tokens(context), kind="retrieval")
+    return f"""You are an expert code assistant that has fully analyzed a codebase.
 Answer the user's question based on the codebase context below.
 Be specific, concise, and use markdown formatting with code blocks where helpful.
 
-User question: {request.message}
+User question: {message}
 
 Codebase context:
-{context[:5000]}"""
+{context}"""
 
-    raw = ai_generate(prompt)
-    return {"response": raw or "I couldn't generate a response. Please check your local Ollama instance."}
 
+DOC_PROMPTS = {
+    "README.md": "Generate a professional, comprehensive README.md with badges, installation, usage examples, and contributing guide.",
+    "CONTRIBUTING.md": "Generate a detailed CONTRIBUTING.md with setup instructions, PR process, coding standards, and commit message format.",
+    "ARCHITECTURE.md": "Generate a technical ARCHITECTURE.md documenting system design, component interactions, data flow, and technical decisions.",
+    "API.md": "Generate a comprehensive API.md documenting all endpoints, request/response schemas, authentication, and usage examples.",
+}
 
-@app.post("/generate")
-def generate_docs(request: RepoRequest):
-    context = ensure_context(request.url)
-    print(f"📝 Generating {request.doc_type}...")
-
-    doc_prompts = {
-        "README.md": "Generate a professional, comprehensive README.md with badges, installation, usage examples, and contributing guide.",
-        "CONTRIBUTING.md": "Generate a detailed CONTRIBUTING.md with setup instructions, PR process, coding standards, and commit message format.",
-        "ARCHITECTURE.md": "Generate a technical ARCHITECTURE.md documenting system design, component interactions, data flow, and technical decisions.",
-        "API.md": "Generate a comprehensive API.md documenting all endpoints, request/response schemas, authentication, and usage examples.",
-    }
 
-    instruction = doc_prompts.get(request.doc_type, f"Generate {request.doc_type}")
-    prompt = f"""{instruction}
+async def build_doc_prompt(ctx: RepoContext, doc_type: str) -> str:
+    instruction = DOC_PROMPTS.get(doc_type, f"Generate {doc_type}")
+    codebase, _ = await repo_context(ctx, output_tokens=2048)
+    return f"""{instruction}
 Output only the markdown content, no additional commentary.
 
 Codebase context:
-{context[:5000]}"""
+{codebase}"""
+
+
+def ndjson_stream(prompt: str) -> StreamingResponse:
+    """
+    Relay Ollama tokens as newline-delimited JSON: {"token": ...} lines, then
+    {"done": true}, or {"error": ...} if generation fails mid-way.
+    """
+
+    async def events():
+        try:
+            async for token in OLLAMA.stream(prompt):
+                yield json.dumps({"token": token}) + "\n"
+            yield json.dumps({"done": True}) + "\n"
+        except Exception as e:
+            print(f"Ollama error: {e}")
+            yield json.dumps({"error": "Generation failed. Please check your local Ollama instance."}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/chat")
+async def chat_with_repo(request: ChatRequest, http_request: Request):
+    ctx = await run_in_threadpool(ensure_context, request.repo_url)
+    print(f"💬 Chatting: {request.message[:50]}...")
 
-    raw = ai_generate(prompt)
+    raw = await ai_generate(build_chat_prompt(ctx, request.message), request=http_request)
+    return {"response": raw or "I couldn't generate a response. Please check your local Ollama instance."}
+
+
+@app.post("/chat/stream")
+async def stream_chat_with_repo(request: ChatRequest):
+    ctx = await run_in_threadpool(ensure_context, request.repo_url)
+    print(f"💬 Chatting (stream): {request.message[:50]}...")
+    return ndjson_stream(build_chat_prompt(ctx, request.message))
+
+
+@app.post("/generate")
+async def generate_docs(request: RepoRequest, http_request: Request):
+    ctx = await run_in_threadpool(ensure_context, request.url)
+    print(f"📝 Generating {request.doc_type}...")
+
+    raw = await ai_generate(await build_doc_prompt(ctx, request.doc_type), request=http_request)
     return {"markdown": raw or f"# {request.doc_type}\n\nGeneration failed."}
 
 
-@app.post("/api/analyze-quality")
-def analyze_code_quality(request: QualityRequest):
+@app.post("/generate/stream")
+async def stream_generate_docs(request: RepoRequest):
+    ctx = await run_in_threadpool(ensure_context, request.url)
+    print(f"📝 Generating {request.doc_type} (stream)...")
+    return ndjson_stream(await build_doc_prompt(ctx, request.doc_type))
+
+
+async def quality_job(job: Job, repo_url: str, stages: StageLimiter | None = None):
     """Analyze code quality metrics using AI."""
-    context = ensure_context(request.repo_url)
-    if "Error:" in context[:100]:
+    job.update(5, "Loading repository")
+    ctx = await run_in_threadpool(ensure_context, repo_url)
+    if not ctx.ok:
         return {"error": "Could not load repository"}
 
-    cache_key = f"quality_{request.repo_url}"
-    if cache_key in ANALYSIS_CACHE:
+    cache_key = analysis_key("quality", ctx)
+    cached = await run_in_threadpool(ANALYSIS_CACHE.get, cache_key)
+    if cached is not None:
         print("🔍 Returning Cached Code Quality...")
-        return ANALYSIS_CACHE[cache_key]
+        return cached
 
     print("🔍 Analyzing Code Quality...")
+    job.update(10, "Summarizing files")
+    codebase, _ = await in_stage(stages, "llm", repo_context(ctx, wait=True))
+    job.update(60, "Waiting for AI review")
 
     prompt = f"""You are a senior software engineer reviewing code quality.
 Analyze this codebase and return a JSON object with the following structure:
@@ -473,33 +637,40 @@ Analyze this codebase and return a JSON object with the following structure:
 }}
 
 Codebase:
-{context[:5000]}
+{codebase}
 
 Return ONLY valid JSON."""
 
-    raw = ai_generate(prompt, is_json=True)
+    raw = await in_stage(stages, "llm", ai_generate(prompt, is_json=True))
     if raw:
         try:
             result = json.loads(raw.replace("```json", "").replace("```", "").strip())
-            ANALYSIS_CACHE[cache_key] = result
+            await run_in_threadpool(ANALYSIS_CACHE.set, cache_key, result)
             return result
         except Exception:
             pass
     return {"error": "Quality analysis failed"}
 
 
-@app.post("/api/generate-tests")
-def generate_tests(request: TestGenRequest):
+@app.post("/api/analyze-quality")
+async def analyze_code_quality(request: QualityRequest):
+    job = JOBS.submit("quality", (request.repo_url,), quality_job, request.repo_url)
+    return await job_result(job)
+
+
+async def tests_job(job: Job, repo_url: str, framework: str, stages: StageLimiter | None = None):
     """Generate unit tests for the analyzed codebase."""
-    context = ensure_context(request.repo_url)
-    if "Error:" in context[:100]:
+    job.update(5, "Loading repository")
+    ctx = await run_in_threadpool(ensure_context, repo_url)
+    if not ctx.ok:
         return {"error": "Could not load repository"}
 
-    print(f"🧪 Generating Tests (framework: {request.framework})...")
+    print(f"🧪 Generating Tests (framework: {framework})...")
+    job.update(20, "Waiting for AI test generation")
 
     framework_hint = ""
-    if request.framework != "auto":
-        framework_hint = f"Use the {request.framework} testing framework."
+    if framework != "auto":
+        framework_hint = f"Use the {framework} testing framework."
     else:
         framework_hint = "Auto-detect the appropriate testing framework based on the language/stack."
 
@@ -528,11 +699,11 @@ Return a JSON object:
 }}
 
 Codebase:
-{context[:5000]}
+{prompt_context(ctx, output_tokens=2048)}
 
 Return ONLY valid JSON."""
 
-    raw = ai_generate(prompt, is_json=True)
+    raw = await in_stage(stages, "llm", ai_generate(prompt, is_json=True))
     if raw:
         try:
             return json.loads(raw.replace("```json", "").replace("```", "").strip())
@@ -541,21 +712,29 @@ Return ONLY valid JSON."""
     return {"error": "Test generation failed"}
 
 
-@app.post("/api/git-insights")
-def get_git_insights(request: GitInsightsRequest):
+@app.post("/api/generate-tests")
+async def generate_tests(request: TestGenRequest):
+    job = JOBS.submit("tests", (request.repo_url, request.framework), tests_job, request.repo_url, request.framework)
+    return await job_result(job)
+
+
+async def git_insights_job(job: Job, repo_url: str, stages: StageLimiter | None = None):
     """Analyze git history for insights."""
-    context = ensure_context(request.repo_url)
-    repo_path = CURRENT_REPO_PATH
+    job.update(5, "Loading repository")
+    ctx = await run_in_threadpool(ensure_context, repo_url)
+    repo_path = ctx.path
 
     if not repo_path or not os.path.exists(repo_path):
         return {"error": "Repository not found"}
 
-    cache_key = f"git_insights_{request.repo_url}"
-    if cache_key in ANALYSIS_CACHE:
+    cache_key = analysis_key("git_insights", ctx)
+    cached = await run_in_threadpool(ANALYSIS_CACHE.get, cache_key)
+    if cached is not None:
         print("📈 Returning Cached Git Insights...")
-        return ANALYSIS_CACHE[cache_key]
+        return cached
 
     print("📈 Analyzing Git History...")
+    job.update(20, "Reading git history")
 
     insights = {
         "total_commits": 0,
@@ -568,61 +747,14 @@ def get_git_insights(request: GitInsightsRequest):
     }
 
     try:
-        repo = git.Repo(repo_path)
-
-        # Basic stats
-        commits = list(repo.iter_commits(max_count=200))
-        insights["total_commits"] = len(commits)
-
-        # Recent commits
-        for commit in commits[:10]:
-            insights["recent_commits"].append(
-                {
-                    "hash": commit.hexsha[:7],
-                    "message": commit.message.strip()[:100],
-                    "author": commit.author.name,
-                    "date": commit.committed_datetime.isoformat(),
-                    "files_changed": len(commit.stats.files),
-                }
-            )
-
-        # Contributors
-        from collections import Counter
-
-        author_counts = Counter(c.author.name for c in commits)
-        insights["contributors"] = [
-            {"name": name, "commits": count}
-            for name, count in author_counts.most_common(10)
-        ]
-
-        # First and last commit
-        if commits:
-            insights["last_commit"] = commits[0].committed_datetime.isoformat()
-            insights["first_commit"] = commits[-1].committed_datetime.isoformat()
-
-        # Most changed files
-        file_changes = Counter()
-        for commit in commits:
-            for f in commit.stats.files:
-                file_changes[f] += 1
-        insights["most_changed_files"] = [
-            {"file": f, "changes": c} for f, c in file_changes.most_common(10)
-        ]
-
-        # Commit frequency by month
-        from collections import defaultdict
-
-        monthly = defaultdict(int)
-        for commit in commits:
-            month_key = commit.committed_datetime.strftime("%Y-%m")
-            monthly[month_key] += 1
-        insights["commit_frequency"] = [
-            {"month": k, "commits": v}
-            for k, v in sorted(monthly.items())[-12:]
-        ]
-
+        with WORKSPACE.lease(repo_path):
+            # Reading history is local disk and CPU work, like the scan
+            insights = await in_stage(stages, "scan", run_in_threadpool(mine_insights, repo_path))
+    except CloneEvicted:
+        raise
     except Exception as e:
         print(f"Git analysis error: {e}")
+        job.update(50, "Git history unavailable, estimating with AI")
         # Try AI-based fallback from code context
         prompt = f"""Based on this codebase, estimate git statistics and return a JSON:
 {{
@@ -633,21 +765,145 @@ def get_git_insights(request: GitInsightsRequest):
     "commit_frequency": [],
     "note": "Estimated from codebase analysis"
 }}
-Context: {context[:5000]}
+Context: {prompt_context(ctx, output_tokens=512)}
 Return ONLY valid JSON."""
-        raw = ai_generate(prompt, is_json=True)
+        raw = await in_stage(stages, "llm", ai_generate(prompt, is_json=True))
         if raw:
             try:
                 result = json.loads(raw.replace("```json", "").replace("```", "").strip())
-                ANALYSIS_CACHE[cache_key] = result
+                await run_in_threadpool(ANALYSIS_CACHE.set, cache_key, result)
                 return result
             except Exception:
                 pass
 
-    ANALYSIS_CACHE[cache_key] = insights
+    await run_in_threadpool(ANALYSIS_CACHE.set, cache_key, insights)
     return insights
 
 
+@app.post("/api/git-insights")
+async def get_git_insights(request: GitInsightsRequest):
+    job = JOBS.submit("git_insights", (request.repo_url,), git_insights_job, request.repo_url)
+    return await job_result(job)
+
+
+JOB_KINDS = {
+    "security": lambda r: ("security", (r.repo_url,), security_job, r.repo_url),
+    "quality": lambda r: ("quality", (r.repo_url,), quality_job, r.repo_url),
+    "tests": lambda r: ("tests", (r.repo_url, r.framework), tests_job, r.repo_url, r.framework),
+    "git_insights": lambda r: ("git_insights", (r.repo_url,), git_insights_job, r.repo_url),
+}
+
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    """Start an analysis in the background; identical in-flight jobs are shared."""
+    if request.kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind. Expected one of: {', '.join(JOB_KINDS)}")
+    job = JOBS.submit(*JOB_KINDS[request.kind](request))
+    return job.to_dict(include_result=False)
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Stream the job as NDJSON on every progress change, ending with its result."""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        version = -1
+        while True:
+            if job.version != version:
+                version = job.version
+                yield json.dumps(job.to_dict()) + "\n"
+            if job.done:
+                break
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+# Job coroutine run for each analysis kind of a batch
+BATCH_ANALYSES = {
+    "security": security_job,
+    "quality": quality_job,
+    "tests": tests_job,
+    "git_insights": git_insights_job,
+}
+
+
+async def batch_repo(repo_url: str, kinds: list[str], framework: str = "auto") -> dict:
+    """
+    Take one repo of a batch through the clone, scan, security and LLM
+    stages (see StageLimiter) and return its per-analysis results.
+    Never raises: failures are reported in "error" / "errors".
+    """
+    started = time.perf_counter()
+    result = {"repo_url": repo_url, "status": "done", "results": {}, "errors": {}}
+    try:
+        # Keep the clone on disk from the first stage to the last
+        with WORKSPACE.lease(clone_path(repo_url), must_exist=False):
+            async with BATCH_STAGES.slot("clone"):
+                path, error = await run_in_threadpool(ensure_clone, repo_url)
+            if path is None:
+                raise RuntimeError(error)
+            async with BATCH_STAGES.slot("scan"):
+                ctx = await run_in_threadpool(ensure_context, repo_url)
+            if not ctx.ok:
+                raise RuntimeError(ctx.error)
+
+            async def analysis(kind):
+                args = (repo_url, framework) if kind == "tests" else (repo_url,)
+                return await BATCH_ANALYSES[kind](Job(kind, args), *args, stages=BATCH_STAGES)
+
+            outcomes = await asyncio.gather(*(analysis(kind) for kind in kinds), return_exceptions=True)
+        for kind, outcome in zip(kinds, outcomes):
+            if isinstance(outcome, Exception):
+                result["errors"][kind] = str(outcome)
+            else:
+                result["results"][kind] = outcome
+    except Exception as e:
+        print(f"❌ Batch analysis failed for {repo_url}: {e}")
+        result["status"] = "failed"
+        result["error"] = str(e)
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+async def batch_lines(repo_urls: list[str], kinds: list[str], framework: str = "auto", in_flight: int = BATCH_IN_FLIGHT):
+    """NDJSON: one line per repo in the order they finish, then a summary line."""
+    started = time.perf_counter()
+    failed = 0
+    async for result in run_bounded(repo_urls, lambda url: batch_repo(url, kinds, framework), in_flight):
+        failed += result["status"] == "failed"
+        yield json.dumps(result) + "\n"
+    summary = {"repos": len(repo_urls), "failed": failed, "seconds": round(time.perf_counter() - started, 2)}
+    yield json.dumps({"summary": summary}) + "\n"
+
+
+@app.post("/api/batch")
+async def analyze_batch(request: BatchRequest):
+    """
+    Analyze many repositories in one call. Repos move through the clone,
+    scan, security and LLM stages independently, each stage with its own
+    concurrency limit, and each repo's results are streamed as an NDJSON
+    line as soon as it is finished.
+    """
+    unknown = [kind for kind in request.kinds if kind not in BATCH_ANALYSES]
+    if unknown or not request.kinds:
+        raise HTTPException(status_code=400, detail=f"Unknown analysis kind. Expected any of: {', '.join(BATCH_ANALYSES)}")
+    kinds = list(dict.fromkeys(request.kinds))
+    return StreamingResponse(batch_lines(request.repo_urls, kinds, request.framework), media_type="application/x-ndjson")
+
+
 # --- HELPERS ---
 def generate_security_report_markdown(issues):
     if not issues:
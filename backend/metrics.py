@@ -0,0 +1,124 @@
+import bisect
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+
+# Default buckets (seconds): from a cache lookup up to a slow clone or model call
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+BYTE_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KB .. 1 GB
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in labels.items()) + "}"
+
+
+class Histogram:
+    """A labelled Prometheus histogram (cumulative buckets, sum and count per label set)."""
+
+    def __init__(self, name: str, help_text: str, buckets=TIME_BUCKETS, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._series: dict[tuple, list] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the block, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._series.items())
+        for key, (counts, total, count) in series:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+def render_gauges(name: str, help_text: str, samples: list[tuple[dict, float]]) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines.extend(f"{name}{format_labels(labels)} {value}" for labels, value in samples)
+    return lines
+
+
+def render_stats(prefix: str, stats: dict) -> list[str]:
+    """Expose every numeric value of a component's stats() dict as a gauge named prefix_key."""
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines += render_gauges(f"{prefix}_{key}", f"{prefix.split('_', 1)[1]} {key} (from /api/stats)", [({}, value)])
+    return lines
+
+
+# Wall-clock time of each pipeline stage: clone, scan_directory, clone_and_scan,
+# the security tools, git insights, summarization, ...
+STAGE_SECONDS = Histogram("devmind_stage_seconds", "Duration of pipeline stages", labelnames=("stage",))
+# Ollama: time queued for a generation slot, total call time (including the queue) and time to first token
+OLLAMA_QUEUE_SECONDS = Histogram("devmind_ollama_queue_seconds", "Time waiting for an Ollama generation slot")
+OLLAMA_GENERATE_SECONDS = Histogram(
+    "devmind_ollama_generate_seconds", "Ollama call duration including queue wait", labelnames=("mode", "outcome")
+)
+OLLAMA_TTFT_SECONDS = Histogram("devmind_ollama_ttft_seconds", "Time to first streamed token")
+PROMPT_TOKENS = Histogram("devmind_prompt_tokens", "Estimated tokens per prompt sent to Ollama", TOKEN_BUCKETS, ("mode",))
+CONTEXT_TOKENS = Histogram("devmind_context_tokens", "Estimated tokens of code context per prompt", TOKEN_BUCKETS, ("kind",))
+REPO_CONTEXT_BYTES = Histogram("devmind_repo_context_bytes", "Scanned context size per loaded repository", BYTE_BUCKETS)
+HTTP_SECONDS = Histogram(
+    "devmind_http_request_seconds", "HTTP request duration by route", labelnames=("method", "route", "status")
+)
+
+HISTOGRAMS = [
+    STAGE_SECONDS,
+    OLLAMA_QUEUE_SECONDS,
+    OLLAMA_GENERATE_SECONDS,
+    OLLAMA_TTFT_SECONDS,
+    PROMPT_TOKENS,
+    CONTEXT_TOKENS,
+    REPO_CONTEXT_BYTES,
+    HTTP_SECONDS,
+]
+
+
+def render(components: dict[str, dict] | None = None) -> str:
+    """
+    Prometheus text exposition of every histogram, plus the numeric fields
+    of each component's stats() dict as devmind_<component>_<field> gauges.
+    """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    for component, stats in (components or {}).items():
+        lines += render_stats(f"devmind_{component}", stats)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from context_packer import model_context_window
+from metrics import OLLAMA_GENERATE_SECONDS, OLLAMA_QUEUE_SECONDS, OLLAMA_TTFT_SECONDS, PROMPT_TOKENS
+from retrieval import estimate_tokens
+
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+# Keep in step with the Ollama server's own OLLAMA_NUM_PARALLEL setting
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "180"))
+
+
+async def wait_for_disconnect(request, interval: float = 0.5):
+    """Return once the HTTP client behind a Starlette request has gone away."""
+    while not await request.is_disconnected():
+        await asyncio.sleep(interval)
+
+
+class OllamaClient:
+    """
+    Async Ollama REST client with a pooled keep-alive connection and a
+    concurrency limit.
+
+    At most `max_parallel` generations run at once; the rest queue on a
+    semaphore and show up as `waiting` in stats(). The HTTP client and
+    semaphore are bound to the event loop that first uses them.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_URL,
+        model: str = OLLAMA_MODEL,
+        max_parallel: int = OLLAMA_NUM_PARALLEL,
+        timeout: float = OLLAMA_TIMEOUT,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_parallel = max(1, max_parallel)
+        self.timeout = timeout
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop = None
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.ttft_count = 0
+        self.ttft_total = 0.0
+        self.ttft_last = 0.0
+        self.ttft_max = 0.0
+
+    def _ensure_client(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_parallel * 2,
+                    max_keepalive_connections=self.max_parallel,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_parallel)
+            self._loop = loop
+
+    def build_payload(self, prompt: str, is_json: bool = False, stream: bool = False) -> dict:
+        # Ollama runs at its default window and silently truncates prompts unless told the size they are packed for
+        payload = {"model": self.model, "prompt": prompt, "stream": stream, "options": {"num_ctx": model_context_window(self.model)}}
+        if is_json:
+            payload["format"] = "json"
+        return payload
+
+    async def _acquire_slot(self, started: float):
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        OLLAMA_QUEUE_SECONDS.observe(time.perf_counter() - started)
+        self.active += 1
+
+    async def _generate(self, prompt: str, is_json: bool, timeout: float) -> str | None:
+        started = time.perf_counter()
+        PROMPT_TOKENS.observe(estimate_tokens(prompt), mode="generate")
+        outcome = "cancelled"
+        try:
+            await self._acquire_slot(started)
+            try:
+                response = await asyncio.wait_for(
+                    self._client.post("/api/generate", json=self.build_payload(prompt, is_json)),
+                    timeout,
+                )
+                response.raise_for_status()
+                self.completed += 1
+                outcome = "ok"
+                return response.json().get("response")
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                outcome = "timeout"
+                print(f"Ollama error: request timed out after {timeout}s")
+                return None
+            except Exception as e:
+                self.failed += 1
+                outcome = "failed"
+                print(f"Ollama error: {e}")
+                return None
+            finally:
+                self.active -= 1
+                self._semaphore.release()
+        finally:
+            OLLAMA_GENERATE_SECONDS.observe(time.perf_counter() - started, mode="generate", outcome=outcome)
+
+    async def generate(self, prompt: str, is_json: bool = False, request=None, timeout: float | None = None) -> str | None:
+        """
+        Generate a completion, returning None on any failure.
+
+        If a Starlette `request` is given, the generation is cancelled as soon
+        as that client disconnects, freeing the slot for queued requests.
+        """
+        self._ensure_client()
+        task = asyncio.ensure_future(self._generate(prompt, is_json, timeout or self.timeout))
+        if request is None:
+            return await task
+
+        watcher = asyncio.ensure_future(wait_for_disconnect(request))
+        try:
+            done, _ = await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+        if task in done:
+            return task.result()
+
+        task.cancel()
+        self.cancelled += 1
+        print("🔌 Client disconnected, cancelled Ollama request.")
+        return None
+
+    def _record_ttft(self, seconds: float):
+        self.ttft_count += 1
+        self.ttft_total += seconds
+        self.ttft_last = seconds
+        self.ttft_max = max(self.ttft_max, seconds)
+        OLLAMA_TTFT_SECONDS.observe(seconds)
+
+    async def stream(self, prompt: str, is_json: bool = False):
+        """
+        Yield response tokens as Ollama produces them.
+
+        Time-to-first-token is measured from the call, so it includes any time
+        spent queued behind other generations. Errors are counted and re-raised;
+        closing the generator early (e.g. the client disconnected) counts as a
+        cancellation and releases the slot.
+        """
+        self._ensure_client()
+        started = time.perf_counter()
+        PROMPT_TOKENS.observe(estimate_tokens(prompt), mode="stream")
+        await self._acquire_slot(started)
+        first_token = True
+        outcome = "failed"
+        try:
+            payload = self.build_payload(prompt, is_json, stream=True)
+            async with self._client.stream("POST", "/api/generate", json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    token = data.get("response", "")
+                    if token:
+                        if first_token:
+                            self._record_ttft(time.perf_counter() - started)
+                            first_token = False
+                        yield token
+                    if data.get("done"):
+                        break
+            self.completed += 1
+            outcome = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            outcome = "cancelled"
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            OLLAMA_GENERATE_SECONDS.observe(time.perf_counter() - started, mode="stream", outcome=outcome)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "max_parallel": self.max_parallel,
+            "waiting": self.waiting,
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "ttft_count": self.ttft_count,
+            "ttft_avg_ms": round(self.ttft_total / self.ttft_count * 1000, 1) if self.ttft_count else 0.0,
+            "ttft_last_ms": round(self.ttft_last * 1000, 1),
+            "ttft_max_ms": round(self.ttft_max * 1000, 1),
+        }
@@ -0,0 +1,64 @@
+import os
+
+from ingest import language_stats
+
+
+# Default page size and expansion depth for /structure responses
+STRUCTURE_PAGE_SIZE = int(os.getenv("STRUCTURE_PAGE_SIZE", "500"))
+STRUCTURE_DEPTH = int(os.getenv("STRUCTURE_DEPTH", "2"))
+
+
+class RepoIndex:
+    """
+    Stats and directory tree of a scanned repository, built once from the
+    ingest walk so /overview-fast and /structure never touch the disk.
+
+    It lives on the RepoContext, so it is rebuilt exactly when the scan is:
+    on first load and whenever the repository is re-ingested.
+    """
+
+    def __init__(self, tree: dict[str, list], line_counts: dict[str, int]):
+        self.tree = tree
+        total_files, total_lines, languages = language_stats(line_counts)
+        complexity = "Low" if total_lines < 5000 else "Medium" if total_lines < 20000 else "High"
+        self.overview = {
+            "total_files": total_files,
+            "total_lines": total_lines,
+            # Top languages by line count
+            "languages": dict(languages.most_common(8)),
+            "complexity": complexity,
+        }
+
+    def has_dir(self, path: str) -> bool:
+        return path in self.tree
+
+    def _node(self, parent: str, name: str, is_dir: bool, depth: int, limit: int) -> dict:
+        path = f"{parent}/{name}" if parent else name
+        node = {"name": name, "type": "folder" if is_dir else "file", "path": path}
+        if is_dir:
+            entries = self.tree.get(path, [])
+            node["child_count"] = len(entries)
+            if depth > 1:
+                node["children"] = [
+                    self._node(path, child, child_is_dir, depth - 1, limit)
+                    for child, child_is_dir in entries[:limit]
+                ]
+        return node
+
+    def subtree(self, path: str = "", depth: int = STRUCTURE_DEPTH, offset: int = 0, limit: int = STRUCTURE_PAGE_SIZE) -> dict:
+        """
+        One page of the entries under `path` ("" for the root).
+
+        Folders are expanded `depth` levels deep (each level capped at
+        `limit` entries); deeper folders carry only `child_count` and are
+        fetched on demand by requesting their `path`.
+        """
+        entries = self.tree.get(path, [])
+        page = entries[offset:offset + limit]
+        return {
+            "path": path,
+            "structure": [self._node(path, name, is_dir, depth, limit) for name, is_dir in page],
+            "total": len(entries),
+            "offset": offset,
+            "has_more": offset + len(page) < len(entries),
+        }
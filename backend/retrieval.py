@@ -0,0 +1,140 @@
+import os
+import re
+import sys
+from collections import Counter
+
+import numpy as np
+
+from ingest import FileChunk
+
+
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))
+
+TOKEN_RE = re.compile(r"[A-Za-z][A-Za-z0-9]*|\d+")
+CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "me", "of", "on", "or", "the", "this", "to",
+    "what", "where", "which", "who", "why", "with", "you", "can", "there",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens, with camelCase / snake_case identifiers also split into parts."""
+    tokens = []
+    for word in TOKEN_RE.findall(text):
+        lower = word.lower()
+        if lower in STOPWORDS or len(lower) < 2:
+            continue
+        tokens.append(lower)
+        parts = CAMEL_RE.findall(word)
+        if len(parts) > 1:
+            tokens.extend(p.lower() for p in parts if len(p) > 1)
+    return tokens
+
+
+# Pieces a BPE tokenizer treats separately: letter runs, digit runs, line breaks + indentation, symbol runs
+TOKEN_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|\n[ \t]*|[^\sA-Za-z\d]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the LLM token count of `text` without a tokenizer.
+
+    Calibrated (slightly conservatively) for code on Llama-style BPE
+    vocabularies: about one token per 5 letters, per 3 digits, per 2
+    symbols, and one per line break with its indentation.
+    """
+    tokens = 1
+    for piece in TOKEN_PIECE_RE.findall(text):
+        first = piece[0]
+        if first.isalpha():
+            tokens += (len(piece) + 4) // 5
+        elif first.isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif first == "\n":
+            tokens += 1
+        else:
+            tokens += (len(piece) + 1) // 2
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over file chunks.
+
+    Postings are stored as NumPy arrays per term so a query is scored with
+    one vectorized update per query term instead of a loop over chunks.
+    """
+
+    def __init__(self, chunks: list[FileChunk], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(chunks)
+
+        postings: dict[str, tuple[list[int], list[int]]] = {}
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for doc_id, chunk in enumerate(chunks):
+            # Index the path with the chunk so "where is ingest?" finds ingest.py
+            counts = Counter(tokenize(chunk.path) + tokenize(chunk.text))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                docs, tfs = postings.setdefault(term, ([], []))
+                docs.append(doc_id)
+                tfs.append(tf)
+
+        self.postings = {
+            term: (np.array(docs, dtype=np.int32), np.array(tfs, dtype=np.float32))
+            for term, (docs, tfs) in postings.items()
+        }
+        avg_length = float(lengths.mean()) if self.size else 0.0
+        self.norms = 1 - b + b * lengths / avg_length if avg_length else np.ones(self.size, dtype=np.float32)
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the index: terms, posting arrays and length norms."""
+        size = sys.getsizeof(self.postings) + sys.getsizeof(self.norms)
+        for term, posting in self.postings.items():
+            size += sys.getsizeof(term) + sys.getsizeof(posting) + sum(sys.getsizeof(array) for array in posting)
+        return size
+
+    def idf(self, doc_freq: int) -> float:
+        return float(np.log(1 + (self.size - doc_freq + 0.5) / (doc_freq + 0.5)))
+
+    def search(self, query: str, top_k: int = 20) -> list[tuple[int, float]]:
+        """Return up to `top_k` (chunk_index, score) pairs with a positive score, best first."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            scores[docs] += self.idf(len(docs)) * tfs * (self.k1 + 1) / (tfs + self.k1 * self.norms[docs])
+
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return []
+        if matched.size > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(i), float(scores[i])) for i in ranked]
+
+
+def select_chunks(index: BM25Index, chunks: list[FileChunk], query: str, token_budget: int) -> list[FileChunk]:
+    """Pick the highest-scoring chunks for `query` that fit in `token_budget` tokens."""
+    selected = []
+    used = 0
+    for chunk_id, _ in index.search(query, top_k=50):
+        chunk = chunks[chunk_id]
+        cost = estimate_tokens(chunk.text) + estimate_tokens(chunk.path) + 4
+        if used + cost > token_budget:
+            continue
+        selected.append(chunk)
+        used += cost
+    return selected
+
+
+def format_chunks(chunks: list[FileChunk]) -> str:
+    return "".join(
+        f"\n\n--- FILE: {c.path} (chars {c.start}-{c.end}) ---\n{c.text}" for c in chunks
+    )
@@ -0,0 +1,239 @@
+import importlib.util
+import json
+import os
+import sys
+import time
+from threading import Lock, Thread
+
+import httpx
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+
+from ingest import BASE_DIR
+
+
+# Local snapshot of the advisory database, in Safety's format (insecure_full.json)
+ADVISORY_DB_PATH = os.getenv("ADVISORY_DB_PATH") or os.path.join(BASE_DIR, "advisories", "insecure_full.json")
+# PyUp's free database, refreshed monthly; what `python -m security.advisories` provisions by default
+PYUP_DB_URL = "https://raw.githubusercontent.com/pyupio/safety-db/master/data/insecure_full.json"
+# Where the snapshot is refreshed from in the background, e.g. PYUP_DB_URL.
+# Empty (the default) = never download: scans stay offline
+ADVISORY_DB_URL = os.getenv("ADVISORY_DB_URL", "")
+ADVISORY_REFRESH_SECONDS = float(os.getenv("ADVISORY_REFRESH_HOURS", "24")) * 3600
+# Distinct (package, version) results remembered across repos
+LOOKUP_CACHE_SIZE = 100_000
+# After a failed download, wait this long (seconds) before trying again
+DOWNLOAD_RETRY_SECONDS = 3600
+
+
+def bundled_snapshot() -> str | None:
+    """The snapshot shipped with the safety-db package (a requirement), used until a local one is provisioned."""
+    spec = importlib.util.find_spec("safety_db")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    path = os.path.join(list(spec.submodule_search_locations)[0], "insecure_full.json")
+    return path if os.path.isfile(path) else None
+
+
+def parse_entries(data: dict) -> dict[str, list[dict]]:
+    """
+    {canonical package name: [raw advisory]} from either snapshot format:
+    Safety 2+/3 ({"meta", "vulnerable_packages": {...}}) or the original
+    safety-db ({"$meta", package: [...]}).
+    """
+    packages = data.get("vulnerable_packages")
+    if packages is None:
+        packages = {k: v for k, v in data.items() if not k.startswith("$") and isinstance(v, list)}
+    index = {}
+    for name, entries in packages.items():
+        index.setdefault(canonicalize_name(name), []).extend(e for e in entries if isinstance(e, dict))
+    return index
+
+
+def normalize_entry(entry: dict) -> dict:
+    """id, cve, advisory text and vulnerable version ranges ("specs") of one advisory, in either format."""
+    ids = {i.get("type"): i.get("id") for i in entry.get("ids", []) if isinstance(i, dict)}
+    return {
+        "id": entry.get("id") or ids.get("pyup") or next(iter(ids.values()), "N/A"),
+        "cve": entry.get("cve") or ids.get("cve") or "N/A",
+        "advisory": entry.get("advisory", ""),
+        "specs": [s for s in entry.get("specs", []) if isinstance(s, str)],
+    }
+
+
+class AdvisoryDatabase:
+    """
+    Offline vulnerability lookups for pinned Python dependencies.
+
+    The advisory snapshot is a single JSON file: the one at ADVISORY_DB_PATH,
+    or, until one is provisioned there, the snapshot bundled with the
+    safety-db package, so lookups work offline out of the box. If ADVISORY_DB_URL is set,
+    it is refreshed from there once older than ADVISORY_REFRESH_HOURS, on
+    a background thread: scans never wait for the network and keep using
+    the current snapshot meanwhile (a failed refresh keeps it, too). It is
+    loaded again once the download lands. It is indexed by canonical package
+    name; version ranges of a package are compiled the first time it is
+    looked up. Results are memoized per (package, version), so a pin shared
+    by many repos is resolved once, not once per repo.
+    """
+
+    def __init__(self, path: str = ADVISORY_DB_PATH, url: str = ADVISORY_DB_URL, refresh_seconds: float = ADVISORY_REFRESH_SECONDS,
+                 bundled: str | None = None):
+        self.path = path
+        self.url = url
+        self.bundled = bundled
+        self.refresh_seconds = refresh_seconds
+        self._lock = Lock()
+        self._entries: dict[str, list[dict]] | None = None
+        self._compiled: dict[str, list[tuple[list[SpecifierSet], dict]]] = {}
+        self._results: dict[tuple[str, str], list[dict]] = {}
+        # (path, mtime) of the loaded snapshot, and when its data was published
+        self._loaded = None
+        self._published = None
+        self._checked = 0.0
+        self._download_attempt = 0.0
+        self._downloading = False
+        self.lookups = 0
+        self.memo_hits = 0
+        self.refresh_failures = 0
+
+    def _refresh(self):
+        try:
+            if not self.download(self.url):
+                with self._lock:
+                    self.refresh_failures += 1
+        finally:
+            with self._lock:
+                self._downloading = False
+                # Pick up the new snapshot on the next ready()
+                self._checked = 0.0
+
+    def download(self, url: str) -> bool:
+        """Replace the local snapshot with the one at `url`. False (old snapshot kept) on failure."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with httpx.stream("GET", url, timeout=60, follow_redirects=True) as response:
+                response.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    for block in response.iter_bytes():
+                        f.write(block)
+            # Don't replace a good snapshot with something unreadable
+            with open(tmp_path, "r", encoding="utf-8") as f:
+                json.load(f)
+            os.replace(tmp_path, self.path)
+            print(f"🛡️  Advisory database refreshed from {url}")
+            return True
+        except (httpx.HTTPError, OSError, ValueError) as e:
+            print(f"⚠️  Could not refresh advisory database: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+    def _snapshot(self) -> tuple[str, float] | None:
+        """(path, mtime) of the snapshot to use: the local one, else the bundled one."""
+        for path in (self.path, self.bundled):
+            if path:
+                try:
+                    return path, os.path.getmtime(path)
+                except OSError:
+                    continue
+        return None
+
+    def ready(self) -> bool:
+        """Make sure a current snapshot is loaded. False if none is available."""
+        now = time.time()
+        with self._lock:
+            # Stat the snapshot at most once a minute
+            if self._entries is not None and now - self._checked < 60:
+                return True
+            self._checked = now
+            snapshot = self._snapshot()
+            stale = snapshot is None or snapshot[0] != self.path or now - snapshot[1] > self.refresh_seconds
+            if (self.url and self.refresh_seconds and stale and not self._downloading
+                    and now - self._download_attempt > DOWNLOAD_RETRY_SECONDS):
+                self._download_attempt = now
+                self._downloading = True
+                Thread(target=self._refresh, name="advisory-refresh", daemon=True).start()
+            if snapshot is None:
+                return False
+            if snapshot != self._loaded:
+                try:
+                    with open(snapshot[0], "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    entries = parse_entries(data)
+                except (OSError, ValueError) as e:
+                    print(f"⚠️  Could not load advisory database {snapshot[0]}: {e}")
+                    return self._entries is not None
+                self._entries = entries
+                self._compiled = {}
+                self._results = {}
+                self._loaded = snapshot
+                meta = data.get("$meta") or data.get("meta") or {}
+                self._published = meta.get("timestamp") if isinstance(meta.get("timestamp"), (int, float)) else snapshot[1]
+                print(f"🛡️  Loaded advisories for {len(entries)} packages from {snapshot[0]}")
+            return True
+
+    def _advisories(self, name: str) -> list[tuple[list[SpecifierSet], dict]]:
+        # Called with self._lock held
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            compiled = []
+            for entry in self._entries.get(name, []):
+                advisory = normalize_entry(entry)
+                specs = []
+                for spec in advisory["specs"]:
+                    try:
+                        specs.append(SpecifierSet(spec, prereleases=True))
+                    except InvalidSpecifier:
+                        continue
+                compiled.append((specs, advisory))
+            self._compiled[name] = compiled
+        return compiled
+
+    def lookup(self, name: str, version: str) -> list[dict]:
+        """Advisories affecting `name`==`version` (call ready() first)."""
+        key = (canonicalize_name(name), version)
+        # Shards of one scan look up from several threads; the memo dicts are shared
+        with self._lock:
+            self.lookups += 1
+            found = self._results.get(key)
+            if found is not None:
+                self.memo_hits += 1
+                return found
+            found = []
+            if key[0] in self._entries:
+                try:
+                    parsed = Version(version)
+                except InvalidVersion:
+                    parsed = None
+                if parsed is not None:
+                    found = [a for specs, a in self._advisories(key[0]) if any(parsed in s for s in specs)]
+            if len(self._results) >= LOOKUP_CACHE_SIZE:
+                self._results.clear()
+            self._results[key] = found
+        return found
+
+    def stats(self) -> dict:
+        loaded = self._loaded
+        return {
+            "packages": len(self._entries or {}),
+            "snapshot_age_seconds": round(time.time() - self._published) if loaded else None,
+            "snapshot_bundled": int(bool(loaded) and loaded[0] != self.path),
+            "lookups": self.lookups,
+            "memo_hits": self.memo_hits,
+            "memoized": len(self._results),
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+ADVISORIES = AdvisoryDatabase(bundled=bundled_snapshot())
+
+
+if __name__ == "__main__":
+    # Provision or update the local snapshot: python -m security.advisories [URL]
+    url = sys.argv[1] if len(sys.argv) > 1 else (ADVISORY_DB_URL or PYUP_DB_URL)
+    sys.exit(0 if ADVISORIES.download(url) else 1)
@@ -1,11 +1,163 @@
-import subprocess
-import json
+import hashlib
+import linecache
 import os
+import time
+from threading import Lock
 
-def run_bandit_analysis(repo_path):
+from bandit import __version__ as BANDIT_VERSION
+from bandit.core import config as b_config, constants as b_constants, manager as b_manager
+
+from analysis_cache import FILE_CACHE_MAX_BYTES, AnalysisCache
+from security.streaming import MAX_FINDINGS, take
+
+# Python files analyzed per batch; the timeout is checked and results are cached between batches
+BANDIT_BATCH_FILES = 50
+# Bump when the cached per-file findings change shape
+BANDIT_CACHE_VERSION = 1
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BanditEngine:
+    """
+    Bandit run in-process through its Python API, with findings cached per
+    file content.
+
+    Plugins are loaded once, when this module is imported, instead of on
+    every CLI start. Each Python file's findings are stored in the
+    per-file results cache (a table of its own, so they never evict model
+    results) under its content hash plus the Bandit version; a file seen
+    before, in this repo or any other, is never analyzed again. Only new
+    or edited files go through Bandit, in batches. Batches are serialized,
+    since Bandit is CPU-bound and keeps module-level state.
+    """
+
+    def __init__(self, cache=None, batch_files=BANDIT_BATCH_FILES):
+        if cache is None:
+            cache = AnalysisCache(max_bytes=FILE_CACHE_MAX_BYTES, table="file_results")
+        self.cache = cache
+        self.batch_files = batch_files
+        self._lock = Lock()
+        self.scans = 0
+        self.files_analyzed = 0
+        self.files_cached = 0
+
+    def _key(self, digest):
+        return self.cache.make_key("bandit_file", digest, BANDIT_CACHE_VERSION, BANDIT_VERSION)
+
+    def _manager(self):
+        return b_manager.BanditManager(b_config.BanditConfig(), "file", quiet=True)
+
+    def discover(self, targets, recursive):
+        """The Python files Bandit's CLI would scan for `targets` (same default exclusions)."""
+        manager = self._manager()
+        manager.discover_files(targets, recursive, ",".join(b_constants.EXCLUDE))
+        return manager.files_list
+
+    def analyze(self, files):
+        """Run Bandit over `files`; returns {path: [finding, ...]} with an entry for every file."""
+        manager = self._manager()
+        manager.files_list = files
+        try:
+            manager.run_tests()
+            findings = {path: [] for path in files}
+            for issue in manager.get_issue_list():
+                result = issue.as_dict()
+                findings.setdefault(result["filename"], []).append({
+                    "severity": result["issue_severity"],
+                    "confidence": result["issue_confidence"],
+                    "title": result["test_name"],
+                    "description": result["issue_text"],
+                    "line": result["line_number"],
+                    "code": result.get("code", "")
+                })
+        finally:
+            # Bandit reads code snippets through linecache; don't keep every scanned file in memory
+            linecache.clearcache()
+        return findings
+
+    def scan(self, targets, recursive=True, timeout=None):
+        """
+        Yield issues for every Python file under `targets`, cached files
+        first, then each analyzed batch as it completes. Raises TimeoutError
+        once `timeout` seconds have passed; batches finished by then stay cached.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        # The lock is only held while Bandit itself runs, never across a yield:
+        # a slow consumer must not stall other scans
+        with self._lock:
+            self.scans += 1
+            files = self.discover(targets, recursive)
+        digests = {}
+        for path in files:
+            try:
+                digests[path] = file_hash(path)
+            except OSError:
+                continue
+        cached = self.cache.get_many([self._key(d) for d in set(digests.values())])
+        pending = []
+        hits = []
+        for path, digest in digests.items():
+            findings = cached.get(self._key(digest))
+            if findings is None:
+                pending.append(path)
+            else:
+                hits.append((path, findings))
+        with self._lock:
+            self.files_cached += len(hits)
+        for path, findings in hits:
+            for finding in findings:
+                yield issue_at(path, finding)
+
+        for start in range(0, len(pending), self.batch_files):
+            if deadline and time.monotonic() > deadline:
+                raise TimeoutError(f"{len(pending) - start} files left unscanned")
+            batch = pending[start:start + self.batch_files]
+            with self._lock:
+                results = self.analyze(batch)
+                self.files_analyzed += len(batch)
+            self.cache.set_many({self._key(digests[path]): results.get(path, []) for path in batch})
+            for path in batch:
+                for finding in results.get(path, []):
+                    yield issue_at(path, finding)
+
+    def stats(self):
+        return {
+            "scans": self.scans,
+            "files_analyzed": self.files_analyzed,
+            "files_cached": self.files_cached,
+        }
+
+
+def issue_at(path, finding):
+    issue = dict(finding, location=f"{path}:{finding['line']}")
+    del issue["line"]
+    return issue
+
+
+ENGINE = BanditEngine()
+
+
+def iter_bandit_issues(repo_path, timeout=None, files=None):
+    """Yield Bandit's issues for the repo (or just `files`) as they are found."""
+    if files is not None:
+        return ENGINE.scan(files, recursive=False, timeout=timeout)
+    return ENGINE.scan([repo_path], recursive=True, timeout=timeout)
+
+
+def run_bandit_analysis(repo_path, timeout=None, files=None, max_findings=MAX_FINDINGS):
     """
     Runs Bandit static analysis on the specified repository path.
-    Parses the JSON output and returns a list of security issues.
+    Returns a list of security issues, at most `max_findings`.
+    Returns None if the tool failed or `timeout` seconds elapsed.
+    If `files` is given, only those files are scanned instead of the whole tree.
+    Files analyzed before (by content) are served from the cache.
     """
     
     # Ensure the path exists
@@ -13,43 +165,14 @@ def run_bandit_analysis(repo_path):
         return []
 
     try:
-        # Run Bandit and capture JSON output
-        # -r: recursive
-        # -f json: output format json
-        # -n: disable --non-recursive (useful when running on a single file)
-        # -q: quiet (only print errors, not progress)
-        command = ["bandit", "-r", repo_path, "-f", "json", "-q"]
-        result = subprocess.run(command, capture_output=True, text=True)
-        
-        # Parse the JSON output
-        bandit_output = json.loads(result.stdout)
-        
-        issues = []
-        for result in bandit_output.get("results", []):
-            issue = {
-                "severity": result["issue_severity"],
-                "confidence": result["issue_confidence"],
-                "title": result["test_name"],
-                "description": result["issue_text"],
-                "location": f"{result['filename']}:{result['line_number']}",
-                "code": result.get("code", "")
-            }
-            issues.append(issue)
-            
-        return issues
-
-    except subprocess.CalledProcessError as e:
-        print(f"Error running Bandit: {e}")
-        print(f"Stdout: {e.stdout}")
-        print(f"Stderr: {e.stderr}")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding Bandit JSON output: {e}")
-        print(f"Bandit Raw Output: {result.stdout}")
-        return []
+        return take(iter_bandit_issues(repo_path, timeout, files), max_findings, "Bandit")
+
+    except TimeoutError as e:
+        print(f"Bandit timed out after {timeout}s ({e})")
+        return None
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-        return []
+        return None
 
 if __name__ == "__main__":
     # Example usage (replace with a real repo path for testing)
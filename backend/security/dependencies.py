@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import tomllib
+from functools import lru_cache
+from typing import NamedTuple
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+
+
+class Dependency(NamedTuple):
+    name: str       # canonical (PEP 503) package name
+    version: str    # exact pinned version
+    path: str       # manifest it was declared in
+    line: int | None
+
+
+def pinned_version(specifier) -> str | None:
+    """The version of an exact pin (==1.2.3 / ===1.2.3); None for ranges and wildcards."""
+    specs = list(specifier)
+    if len(specs) == 1 and specs[0].operator in ("==", "===") and "*" not in specs[0].version:
+        return specs[0].version
+    return None
+
+
+# The same requirement lines recur across repos; parsing them dominates manifest handling
+@lru_cache(maxsize=50_000)
+def parse_requirement(text: str) -> tuple[str, str] | None:
+    try:
+        req = Requirement(text)
+    except InvalidRequirement:
+        return None
+    version = pinned_version(req.specifier)
+    return (canonicalize_name(req.name), version) if version else None
+
+
+def parse_requirements_txt(path: str, seen: set | None = None) -> list[Dependency]:
+    """Pinned requirements, following -r/--requirement includes; options, URLs and hashes are skipped."""
+    seen = seen if seen is not None else set()
+    if path in seen:
+        return []
+    seen.add(path)
+    deps = []
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        lines = f.read().replace("\\\n", " ").splitlines()
+    for number, raw in enumerate(lines, 1):
+        line = re.sub(r"(^|\s)#.*$", "", raw).strip()
+        if not line:
+            continue
+        include = re.match(r"^(?:-r|--requirement)[\s=]+(\S+)", line)
+        if include:
+            target = os.path.normpath(os.path.join(os.path.dirname(path), include.group(1)))
+            if os.path.isfile(target):
+                deps += parse_requirements_txt(target, seen)
+            continue
+        if line.startswith("-"):
+            continue
+        # Drop per-requirement options such as --hash=...
+        parsed = parse_requirement(re.split(r"\s+--?\w", line, maxsplit=1)[0])
+        if parsed:
+            deps.append(Dependency(*parsed, path, number))
+    return deps
+
+
+def parse_pipfile_lock(path: str) -> list[Dependency]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    deps = []
+    for section in ("default", "develop"):
+        for name, info in (data.get(section) or {}).items():
+            spec = info.get("version", "") if isinstance(info, dict) else ""
+            parsed = parse_requirement(f"{name}{spec}")
+            if parsed:
+                deps.append(Dependency(*parsed, path, None))
+    return deps
+
+
+def parse_toml_table(table: dict, path: str) -> list[Dependency]:
+    """Pipfile [packages] / Poetry dependency tables: name = "==1.0" | "1.0" | {version = "..."}."""
+    deps = []
+    for name, spec in table.items():
+        if isinstance(spec, dict):
+            spec = spec.get("version", "")
+        if not isinstance(spec, str) or name.lower() == "python":
+            continue
+        spec = spec.strip()
+        if re.match(r"^\d[\w.!+-]*$", spec):
+            # A bare version is an exact pin in Poetry
+            spec = f"=={spec}"
+        parsed = parse_requirement(f"{name}{spec}")
+        if parsed:
+            deps.append(Dependency(*parsed, path, None))
+    return deps
+
+
+def parse_pyproject(path: str) -> list[Dependency]:
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    project = data.get("project", {})
+    requirements = list(project.get("dependencies", []))
+    for extra in project.get("optional-dependencies", {}).values():
+        requirements += extra
+    deps = [Dependency(*parsed, path, None) for parsed in map(parse_requirement, requirements) if parsed]
+    poetry = data.get("tool", {}).get("poetry", {})
+    deps += parse_toml_table(poetry.get("dependencies", {}), path)
+    for group in poetry.get("group", {}).values():
+        deps += parse_toml_table(group.get("dependencies", {}), path)
+    return deps
+
+
+def parse_pipfile(path: str) -> list[Dependency]:
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    return parse_toml_table(data.get("packages", {}), path) + parse_toml_table(data.get("dev-packages", {}), path)
+
+
+PARSERS = {
+    "requirements.txt": parse_requirements_txt,
+    "Pipfile.lock": parse_pipfile_lock,
+    "pyproject.toml": parse_pyproject,
+    "Pipfile": parse_pipfile,
+}
+
+
+def parse_manifest(path: str) -> list[Dependency]:
+    """Pinned dependencies declared in one manifest; [] if it can't be read or parsed."""
+    parser = PARSERS.get(os.path.basename(path))
+    if parser is None:
+        return []
+    try:
+        return parser(path)
+    except (OSError, ValueError, tomllib.TOMLDecodeError) as e:
+        print(f"⚠️  Could not parse {path}: {e}")
+        return []
@@ -1,57 +1,56 @@
 import subprocess
-import json
 import os
 
-def run_detect_secrets_analysis(repo_path):
+from security.streaming import MAX_FINDINGS, take, tool_output
+
+
+def iter_detect_secrets_issues(repo_path, timeout=None, files=None):
     """
-    Runs detect-secrets analysis on the specified repository path.
-    Parses the JSON output and returns a list of security issues.
+    Run detect-secrets and yield its findings file by file as they are parsed.
+    Raises subprocess.TimeoutExpired or ValueError (unreadable output).
     """
-    
-    # Ensure the path exists
-    if not os.path.isdir(repo_path):
-        return []
-
-    try:
-        # Run detect-secrets and capture JSON output
-        # --all-files: Scan all files, not just changed ones
-        # --json: Output in JSON format
-        # --force-print: Print even if no secrets found (to ensure JSON output)
-        command = ["detect-secrets", "scan", "--all-files", repo_path]
-        result = subprocess.run(command, capture_output=True, text=True)
-        
-        # Parse the JSON output
-        secrets_output = json.loads(result.stdout)
-        
-        issues = []
-        # detect-secrets output structure might vary, so adapt this
-        # based on actual output. Assuming 'results' contains file paths,
-        # and each file path contains a list of 'secrets'.
-        for filename, file_secrets in secrets_output.get("results", {}).items():
+    # --all-files: Scan all files, not just changed ones
+    command = ["detect-secrets", "scan", "--all-files", "."]
+    if files is not None:
+        command = ["detect-secrets", "scan", *(os.path.relpath(f, repo_path) for f in files)]
+    # detect-secrets resolves paths against its working directory and drops files outside it
+    with tool_output(command, timeout, cwd=repo_path) as report:
+        # "results" maps each file path (relative to the repo) to the secrets found in it
+        for filename, file_secrets in report.members("results"):
             for secret in file_secrets:
-                issue = {
+                yield {
                     "severity": "CRITICAL", # detect-secrets doesn't have severity, default to CRITICAL for now
                     "title": f"Secret Found: {secret.get('type', 'Unknown Type')}",
-                    "location": f"{filename}:{secret.get('line_number', 'N/A')}",
+                    "location": f"{os.path.join(repo_path, filename)}:{secret.get('line_number', 'N/A')}",
                     "description": f"Potential secret exposed. Type: {secret.get('type', 'N/A')}, Hash: {secret.get('hashed_secret', 'N/A')}",
                     "code": secret.get('secret_content', '') # May not always be available or desired
                 }
-                issues.append(issue)
-            
-        return issues
 
-    except subprocess.CalledProcessError as e:
-        print(f"Error running detect-secrets: {e}")
-        print(f"Stdout: {e.stdout}")
-        print(f"Stderr: {e.stderr}")
+
+def run_detect_secrets_analysis(repo_path, timeout=None, files=None, max_findings=MAX_FINDINGS):
+    """
+    Runs detect-secrets analysis on the specified repository path.
+    Returns a list of security issues, at most `max_findings` (the scan is stopped there).
+    Returns None if the tool failed or `timeout` seconds elapsed (the tool is killed).
+    If `files` is given, only those files are scanned instead of the whole tree.
+    """
+    
+    # Ensure the path exists
+    if not os.path.isdir(repo_path):
         return []
-    except json.JSONDecodeError as e:
+
+    try:
+        return take(iter_detect_secrets_issues(repo_path, timeout, files), max_findings, "detect-secrets")
+
+    except subprocess.TimeoutExpired:
+        print(f"detect-secrets timed out after {timeout}s")
+        return None
+    except ValueError as e:
         print(f"Error decoding detect-secrets JSON output: {e}")
-        print(f"detect-secrets Raw Output: {result.stdout}")
-        return []
+        return None
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-        return []
+        return None
 
 if __name__ == "__main__":
     # Example usage (replace with a real repo path for testing)
@@ -0,0 +1,88 @@
+import os
+
+import git
+
+from ingest import BASE_DIR, load_json, repo_state_path, save_json
+from security.safety_analyzer import DEPENDENCY_FILES
+
+
+# Last scanned commit, files that differed from it at scan time and per-file findings for each repo and tool
+STATE_DIR = os.path.join(BASE_DIR, "security_scans")
+STATE_VERSION = 2
+
+# Past this many changed files a full scan is cheaper than a long target list
+MAX_INCREMENTAL_FILES = 500
+
+
+def state_path(repo_path):
+    return repo_state_path(STATE_DIR, "scan", repo_path)
+
+
+def load_scan_state(repo_path):
+    """Return {tool: {"commit": sha, "dirty": [relative_path], "findings": {relative_path: [issues]}}}, or {}."""
+    data = load_json(state_path(repo_path), STATE_VERSION)
+    return data.get("tools", {}) if data else {}
+
+
+def save_scan_state(repo_path, tools):
+    save_json(state_path(repo_path), {"version": STATE_VERSION, "tools": tools}, "security scan state")
+
+
+def head_commit(repo_path):
+    try:
+        return git.Repo(repo_path).head.commit.hexsha
+    except Exception:
+        return None
+
+
+def changed_files_since(repo_path, commit):
+    """
+    Repo-relative paths changed between `commit` and the working tree,
+    plus untracked files. Returns None when the diff can't be computed
+    (e.g. the commit is missing from a shallow clone), meaning "scan everything".
+    """
+    try:
+        repo = git.Repo(repo_path)
+        diff = repo.git.diff("--name-only", "--no-renames", commit)
+        return set(diff.splitlines()) | set(repo.untracked_files)
+    except Exception:
+        return None
+
+
+def issue_file(issue, repo_path):
+    """Repo-relative file of a "path:line" issue location."""
+    path = issue["location"].rsplit(":", 1)[0] if ":" in os.path.basename(issue["location"]) else issue["location"]
+    return os.path.relpath(os.path.abspath(path), repo_path)
+
+
+def group_by_file(issues, repo_path):
+    grouped = {}
+    for issue in issues:
+        grouped.setdefault(issue_file(issue, repo_path), []).append(issue)
+    return grouped
+
+
+def python_targets(changed):
+    return sorted(p for p in changed if p.endswith(".py"))
+
+
+def all_targets(changed):
+    return sorted(changed)
+
+
+def dependency_targets(changed):
+    """
+    Recheck the dependency files (at any depth) that changed. Any other
+    changed .txt file may be pulled in by a `-r` include, so recheck them all.
+    """
+    manifests = sorted(p for p in changed if os.path.basename(p) in DEPENDENCY_FILES)
+    if any(p.endswith(".txt") and p not in manifests for p in changed):
+        return None
+    return manifests
+
+
+def merge_findings(previous, new_issues, changed, repo_path):
+    """Replace the findings of changed (or deleted) files with the fresh results."""
+    merged = {f: issues for f, issues in previous.items() if f not in changed}
+    merged.update(group_by_file(new_issues, repo_path))
+    return merged
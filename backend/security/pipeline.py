@@ -0,0 +1,218 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from metrics import STAGE_SECONDS
+from security.bandit_analyzer import run_bandit_analysis
+from security.detect_secrets_analyzer import run_detect_secrets_analysis
+from security.safety_analyzer import run_safety_analysis
+from security.shards import SECURITY_WORKERS, dedupe_issues, discover_layout, find_packages, split_shards
+from security.streaming import MAX_FINDINGS
+from security.incremental import (
+    MAX_INCREMENTAL_FILES,
+    all_targets,
+    changed_files_since,
+    dependency_targets,
+    group_by_file,
+    head_commit,
+    load_scan_state,
+    merge_findings,
+    python_targets,
+    save_scan_state,
+)
+
+
+# Per-tool wall-clock limit in seconds; a tool that exceeds it keeps its previous findings
+TOOL_TIMEOUT = float(os.getenv("SECURITY_TOOL_TIMEOUT", "300"))
+
+
+def normalize_bandit(issue):
+    return {
+        "severity": issue["severity"],
+        "title": f"Bandit: {issue['title']}",
+        "location": issue["location"],
+        "description": f"{issue['description']} (Confidence: {issue['confidence']})",
+    }
+
+
+def normalize_secret(issue):
+    return {
+        "severity": issue["severity"],
+        "title": f"Secret: {issue['title']}",
+        "location": issue["location"],
+        "description": issue["description"],
+    }
+
+
+def normalize_safety(issue):
+    return {
+        "severity": issue["severity"],
+        "title": f"Safety: {issue['title']}",
+        "location": issue["location"],
+        "description": issue["description"],
+    }
+
+
+# (name, runner, normalizer, targets, scope) in the order their issues are reported.
+# `targets(changed_paths)` picks what to rescan: a file list, [] to skip, or None for the whole repo.
+# `scope(layout)` lists the files a full scan covers, which are then split into package shards run in
+# parallel; tools without one run once over the whole repo (Bandit is in-process and serialized anyway).
+TOOLS = [
+    ("bandit", run_bandit_analysis, normalize_bandit, python_targets, None),
+    ("detect-secrets", run_detect_secrets_analysis, normalize_secret, all_targets, lambda layout: layout.files),
+    ("safety", run_safety_analysis, normalize_safety, dependency_targets, lambda layout: layout.manifests),
+]
+
+
+def _timed(name, runner, repo_path, deadline, files):
+    """Run one tool (or shard of it) with whatever is left of the time budget. Returns (issues, finished at)."""
+    timeout = deadline - time.monotonic() if deadline else None
+    if timeout is not None and timeout <= 0:
+        print(f"⏱️  {name}: no time left to start a shard, skipping")
+        return None, time.monotonic()
+    started = time.perf_counter()
+    try:
+        issues = runner(repo_path, timeout=timeout, files=files)
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+    return issues, time.monotonic()
+
+
+def plan_tool(repo_path, tool_state, commit, targets):
+    """
+    Decide how to bring one tool's findings up to `commit`.
+    Returns (changed_paths or None for a full scan, files to pass to the tool).
+    """
+    if not commit or not tool_state:
+        return None, None
+    changed = changed_files_since(repo_path, tool_state["commit"])
+    if changed is not None:
+        # Files that differed from the commit when it was scanned may have been restored or deleted since
+        changed |= set(tool_state.get("dirty", ()))
+    if changed is None or len(changed) > MAX_INCREMENTAL_FILES:
+        return None, None
+    selected = targets(changed)
+    if selected is None:
+        return None, None
+    files = [os.path.join(repo_path, p) for p in selected if os.path.isfile(os.path.join(repo_path, p))]
+    return changed, files
+
+
+def run_security_tools(repo_path, timeout=TOOL_TIMEOUT):
+    """
+    Run every security tool on the repo concurrently. Returns (issues,
+    failed): their normalized issues (bandit, then detect-secrets, then
+    safety) and the names of the tools that failed or timed out, whose
+    findings are missing or stale.
+
+    The tools are independent, so the wall-clock time is the slowest tool
+    rather than the sum. detect-secrets and the dependency check are split
+    into shards, one per package subtree (every directory holding a
+    manifest), that run in parallel on a shared worker pool; their findings
+    are merged and deduplicated by location. All of it shares one `timeout`
+    budget.
+
+    Each tool remembers the commit it last scanned; when that commit is
+    reachable, only files changed since then (plus uncommitted and
+    untracked ones, and files that were uncommitted or untracked at the
+    last scan, since they may have been restored or deleted) are rescanned
+    and merged with the stored findings for everything else. A tool that fails (or any of its shards) keeps its
+    previous findings and commit.
+    """
+    if not repo_path or not os.path.isdir(repo_path):
+        return [], [name for name, *_ in TOOLS]
+
+    with STAGE_SECONDS.time(stage="security_tools"):
+        return _run_security_tools(os.path.abspath(repo_path), timeout)
+
+
+def shard_tool(repo_path, scope, files, layout):
+    """Split a sharded tool's targets (all of `scope` for a full scan) into [absolute paths] per shard."""
+    if files is None:
+        relative, packages = scope(layout), layout.packages
+    else:
+        relative = [os.path.relpath(f, repo_path) for f in files]
+        packages = find_packages(repo_path, relative)
+    return [[os.path.join(repo_path, p) for p in paths] for _, paths in split_shards(relative, packages)]
+
+
+def _run_security_tools(repo_path, timeout):
+    commit = head_commit(repo_path)
+    # What the working tree holds beyond `commit`: findings are of the tree, so the next scan rechecks these
+    dirty = changed_files_since(repo_path, commit) if commit else None
+    if dirty is None:
+        # Without it the findings can't be tied to a commit: scan everything and keep no state
+        commit = None
+    state = load_scan_state(repo_path)
+    layout = None
+    started = time.monotonic()
+    deadline = started + timeout if timeout else None
+    all_issues, failed = [], []
+    with ThreadPoolExecutor(max_workers=SECURITY_WORKERS, thread_name_prefix="security") as pool:
+        jobs = []
+        for name, runner, normalize, targets, scope in TOOLS:
+            tool_state = state.get(name)
+            changed, files = plan_tool(repo_path, tool_state, commit, targets)
+            futures = []
+            if files != [] and scope is None:
+                futures = [pool.submit(_timed, name, runner, repo_path, deadline, files)]
+            elif files != []:
+                if files is None and layout is None:
+                    layout = discover_layout(repo_path)
+                futures = [
+                    pool.submit(_timed, name, runner, repo_path, deadline, shard)
+                    for shard in shard_tool(repo_path, scope, files, layout)
+                ]
+            jobs.append((name, normalize, tool_state, changed, files, futures))
+
+        for name, normalize, tool_state, changed, files, futures in jobs:
+            findings = tool_state["findings"] if tool_state else {}
+            if files != []:
+                issues, finished = [], started
+                for future in futures:
+                    try:
+                        wait = max(deadline - time.monotonic(), 0) + 5 if deadline else None
+                        shard_issues, shard_finished = future.result(timeout=wait)
+                    except FutureTimeoutError:
+                        print(f"⏱️  {name} did not finish within {timeout}s, skipping")
+                        shard_issues = None
+                    except Exception as e:
+                        print(f"An unexpected error occurred running {name}: {e}")
+                        shard_issues = None
+                    if shard_issues is None:
+                        # One failed shard fails the tool: its previous findings and commit are kept
+                        issues = None
+                        for pending in futures:
+                            pending.cancel()
+                        break
+                    issues.extend(shard_issues)
+                    finished = max(finished, shard_finished)
+
+                if issues is None:
+                    failed.append(name)
+                else:
+                    issues = dedupe_issues(issues)
+                    if MAX_FINDINGS and len(issues) > MAX_FINDINGS:
+                        print(f"⚠️  {name}: keeping {MAX_FINDINGS} of {len(issues)} findings (SECURITY_MAX_FINDINGS)")
+                        issues = issues[:MAX_FINDINGS]
+                    scope = "full" if changed is None else f"{len(changed)} changed files"
+                    shards = f", {len(futures)} shards" if len(futures) > 1 else ""
+                    print(f"🛡️  {name} ({scope}{shards}): {len(issues)} issues in {finished - started:.1f}s")
+                    if changed is None:
+                        findings = group_by_file(issues, repo_path)
+                    else:
+                        findings = merge_findings(findings, issues, changed, repo_path)
+                    if commit:
+                        state[name] = {"commit": commit, "dirty": sorted(dirty), "findings": findings}
+            else:
+                print(f"🛡️  {name}: no relevant changes, reusing stored findings")
+                if commit and tool_state:
+                    state[name] = {"commit": commit, "dirty": sorted(dirty), "findings": merge_findings(findings, [], changed, repo_path)}
+                    findings = state[name]["findings"]
+
+            for file_issues in findings.values():
+                all_issues.extend(normalize(issue) for issue in file_issues)
+
+    if commit:
+        save_scan_state(repo_path, state)
+    return all_issues, failed
@@ -1,82 +1,114 @@
 import subprocess
-import json
 import os
 
-def run_safety_analysis(repo_path):
-    """
-    Runs Safety dependency vulnerability analysis on the specified repository path.
-    Looks for requirements.txt or similar files.
-    Parses the JSON output and returns a list of security issues.
-    """
-    
-    issues = []
-    
-    # List of common Python dependency files
-    dependency_files = [
-        "requirements.txt",
-        "Pipfile.lock",
-        "pyproject.toml", # poetry.lock for poetry projects, but pyproject.toml is common
-        "Pipfile"
-    ]
+from security.advisories import ADVISORIES
+from security.dependencies import parse_manifest
+from security.streaming import MAX_FINDINGS, take, tool_output
 
-    found_dep_file = None
-    for dep_file in dependency_files:
-        full_path = os.path.join(repo_path, dep_file)
-        if os.path.exists(full_path):
-            found_dep_file = full_path
-            break
+# List of common Python dependency files, in the order they are looked for
+DEPENDENCY_FILES = [
+    "requirements.txt",
+    "Pipfile.lock",
+    "pyproject.toml", # poetry.lock for poetry projects, but pyproject.toml is common
+    "Pipfile"
+]
 
-    if not found_dep_file:
-        return []
-
-    print(f"Running Safety on {found_dep_file}...")
-    try:
-        # Run Safety and capture JSON output
-        # --full-report: get all details
-        # --json: output as json
-        # -r: specify requirements file
-        command = ["safety", "check", "--full-report", "--json", "-r", found_dep_file]
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        
-        # Safety might return non-zero exit code even for successful runs with vulnerabilities
-        # So we need to check stderr for actual errors and stdout for json output
-        if result.stderr and "Error" in result.stderr:
-            print(f"Error running Safety: {result.stderr}")
-            return []
 
-        # Parse the JSON output
-        safety_output = json.loads(result.stdout)
-        
-        for vuln in safety_output:
-            # Safety output structure example:
+def iter_safety_issues(dep_file, timeout=None):
+    """
+    Run Safety on one dependency file and yield its vulnerabilities as they are parsed.
+    Raises subprocess.TimeoutExpired or ValueError (unreadable output, e.g. Safety failed).
+    """
+    # --full-report: get all details
+    # --json: output as json
+    # -r: specify requirements file
+    command = ["safety", "check", "--full-report", "--json", "-r", dep_file]
+    with tool_output(command, timeout) as report:
+        # Older Safety releases print a bare list; newer ones an object with "vulnerabilities"
+        vulns = report.members() if report.peek() == "[" else report.members("vulnerabilities")
+        for vuln in vulns:
             # [{"vulnerability_id": "pyup.io-2020-5690", "package_name": "django", ...}]
-            issue = {
+            yield {
                 "severity": "HIGH", # Safety doesn't give severity, defaulting to HIGH for now
                 "title": f"Insecure Dependency: {vuln.get('package_name', 'N/A')} ({vuln.get('vulnerability_id', 'N/A')})",
-                "location": found_dep_file,
-                "description": (f"Vulnerability in {vuln.get('package_name', 'N/A')} version {vuln.get('installed_version', 'N/A')}. "
-                                f"Affected versions: {vuln.get('vulnerable_versions', 'N/A')}. "
-                                f"Recommended fix: {vuln.get('fixed_version', 'N/A')}. "
-                                f"CVE: {vuln.get('cve', 'N/A')}. "
+                "location": dep_file,
+                "description": (f"Vulnerability in {vuln.get('package_name', 'N/A')} version {vuln.get('installed_version', vuln.get('analyzed_version', 'N/A'))}. "
+                                f"Affected versions: {vuln.get('vulnerable_versions', vuln.get('vulnerable_spec', 'N/A'))}. "
+                                f"Recommended fix: {vuln.get('fixed_version', vuln.get('fixed_versions', 'N/A'))}. "
+                                f"CVE: {vuln.get('cve', vuln.get('CVE', 'N/A'))}. "
                                 f"Advisory: {vuln.get('advisory', 'N/A')}"),
                 "code": "" # Not directly applicable here
             }
-            issues.append(issue)
-            
-        return issues
 
-    except subprocess.CalledProcessError as e:
-        print(f"Error running Safety: {e}")
-        print(f"Stdout: {e.stdout}")
-        print(f"Stderr: {e.stderr}")
+
+def iter_advisory_issues(dep_files):
+    """
+    Check the pinned dependencies of `dep_files` against the local advisory
+    snapshot (no Safety process, no network).
+    """
+    seen = set()
+    for dep_file in dep_files:
+        for dep in parse_manifest(dep_file):
+            # A file included (-r) by several requirements files is reported once
+            if (dep.path, dep.name, dep.version) in seen:
+                continue
+            seen.add((dep.path, dep.name, dep.version))
+            for advisory in ADVISORIES.lookup(dep.name, dep.version):
+                yield {
+                    "severity": "HIGH",
+                    "title": f"Insecure Dependency: {dep.name} ({advisory['id']})",
+                    "location": f"{dep.path}:{dep.line}" if dep.line else dep.path,
+                    "description": (f"Vulnerability in {dep.name} version {dep.version}. "
+                                    f"Affected versions: {', '.join(advisory['specs']) or 'N/A'}. "
+                                    f"CVE: {advisory['cve']}. "
+                                    f"Advisory: {advisory['advisory'] or 'N/A'}"),
+                    "code": ""
+                }
+
+
+def iter_cli_issues(dep_files, timeout=None):
+    """Run the Safety CLI on the first dependency file of each directory (in DEPENDENCY_FILES order)."""
+    by_dir = {}
+    for dep_file in dep_files:
+        by_dir.setdefault(os.path.dirname(dep_file), []).append(dep_file)
+    for directory, found in by_dir.items():
+        dep_file = min(found, key=lambda f: DEPENDENCY_FILES.index(os.path.basename(f)))
+        print(f"Running Safety on {dep_file}...")
+        yield from iter_safety_issues(dep_file, timeout)
+
+
+def run_safety_analysis(repo_path, timeout=None, files=None, max_findings=MAX_FINDINGS):
+    """
+    Runs Safety dependency vulnerability analysis on the specified repository path.
+    Looks for requirements.txt or similar files in the repo root, or checks
+    the dependency files given in `files` (at any depth).
+    Pinned versions are resolved against the local advisory snapshot when one
+    is available; otherwise the Safety CLI is run on the first dependency file
+    of each directory.
+    Returns a list of security issues, at most `max_findings`.
+    Returns None if the tool failed or `timeout` seconds elapsed (the tool is killed).
+    """
+
+    if files is None:
+        files = [os.path.join(repo_path, f) for f in DEPENDENCY_FILES if os.path.isfile(os.path.join(repo_path, f))]
+    files = [f for f in files if os.path.basename(f) in DEPENDENCY_FILES]
+    if not files:
         return []
-    except json.JSONDecodeError as e:
+
+    try:
+        if ADVISORIES.ready():
+            return take(iter_advisory_issues(files), max_findings, "Safety")
+        return take(iter_cli_issues(files, timeout), max_findings, "Safety")
+
+    except subprocess.TimeoutExpired:
+        print(f"Safety timed out after {timeout}s")
+        return None
+    except ValueError as e:
         print(f"Error decoding Safety JSON output: {e}")
-        print(f"Safety Raw Output: {result.stdout}")
-        return []
+        return None
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-        return []
+        return None
 
 if __name__ == "__main__":
     # Example usage (replace with a real repo path for testing)
@@ -0,0 +1,108 @@
+import os
+from typing import NamedTuple
+
+from ingest import IGNORE_DIRS
+from security.safety_analyzer import DEPENDENCY_FILES
+
+
+# Threads running scan shards (detect-secrets processes, dependency checks) at once
+SECURITY_WORKERS = int(os.getenv("SECURITY_WORKERS", str(max(2, os.cpu_count() or 1))))
+# Package subtrees are split into shards of this many files or fewer, so no single shard dominates the
+# wall-clock time; small repos still get split across workers, down to SHARD_MIN_FILES a shard
+SHARD_MAX_FILES = 1000
+SHARD_MIN_FILES = 100
+# Shard files are passed on a tool's command line (repo-relative); stay well under Windows' 32K-character limit
+SHARD_MAX_ARGV_CHARS = 24_000
+
+# Files that mark the root of a package in a monorepo
+PACKAGE_MARKERS = set(DEPENDENCY_FILES) | {
+    "setup.py", "setup.cfg", "package.json", "go.mod", "Cargo.toml", "pom.xml", "build.gradle",
+}
+
+
+class RepoLayout(NamedTuple):
+    files: list[str]      # every scannable file, repo-relative
+    packages: list[str]   # package root directories, repo-relative ("" = the repo root)
+    manifests: list[str]  # Python dependency files at any depth, repo-relative
+
+
+def discover_layout(repo_path: str) -> RepoLayout:
+    """Walk the repo once, collecting its files, package roots and dependency files."""
+    files, packages, manifests = [], [""], []
+    for root, dirs, names in os.walk(repo_path):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORE_DIRS)
+        relative_dir = os.path.relpath(root, repo_path)
+        relative_dir = "" if relative_dir == "." else relative_dir
+        if relative_dir and PACKAGE_MARKERS.intersection(names):
+            packages.append(relative_dir)
+        for name in sorted(names):
+            path = os.path.join(relative_dir, name)
+            if os.path.islink(os.path.join(root, name)):
+                continue
+            files.append(path)
+            if name in DEPENDENCY_FILES:
+                manifests.append(path)
+    return RepoLayout(files, packages, manifests)
+
+
+def find_packages(repo_path: str, files: list[str]) -> list[str]:
+    """Package roots among the directories holding repo-relative `files` (for scans without a layout)."""
+    directories = set()
+    for path in files:
+        directory = os.path.dirname(path)
+        while directory and directory not in directories:
+            directories.add(directory)
+            directory = os.path.dirname(directory)
+    return [""] + sorted(
+        d for d in directories if any(os.path.isfile(os.path.join(repo_path, d, m)) for m in PACKAGE_MARKERS)
+    )
+
+
+def package_of(path: str, packages: set[str]) -> str:
+    """The innermost package root containing the repo-relative `path`."""
+    directory = os.path.dirname(path)
+    while directory and directory not in packages:
+        directory = os.path.dirname(directory)
+    return directory
+
+
+def split_shards(files: list[str], packages: list[str], workers: int = SECURITY_WORKERS) -> list[tuple[str, list[str]]]:
+    """
+    Group repo-relative `files` by package subtree (nested packages get
+    their own shards) and split large groups so that `workers` have
+    something to run in parallel. A shard's paths never add up to more
+    than SHARD_MAX_ARGV_CHARS, so it fits on one command line.
+    Returns [(package root, files)], largest first so the slowest shards start early.
+    """
+    max_files = min(SHARD_MAX_FILES, max(SHARD_MIN_FILES, -(-len(files) // max(workers, 1))))
+    packages = set(packages)
+    grouped = {}
+    for path in files:
+        grouped.setdefault(package_of(path, packages), []).append(path)
+    shards = []
+    for package, paths in grouped.items():
+        shard, chars = [], 0
+        for path in paths:
+            # Separator and quotes included
+            size = len(path) + 3
+            if shard and (len(shard) >= max_files or chars + size > SHARD_MAX_ARGV_CHARS):
+                shards.append((package, shard))
+                shard, chars = [], 0
+            shard.append(path)
+            chars += size
+        if shard:
+            shards.append((package, shard))
+    shards.sort(key=lambda shard: len(shard[1]), reverse=True)
+    return shards
+
+
+def dedupe_issues(issues: list[dict]) -> list[dict]:
+    """Drop repeats of the same finding at the same location (e.g. a file included by two manifests)."""
+    seen = set()
+    unique = []
+    for issue in issues:
+        key = (issue["location"], issue["title"], issue.get("description"))
+        if key not in seen:
+            seen.add(key)
+            unique.append(issue)
+    return unique
@@ -0,0 +1,186 @@
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+# Most findings kept per tool and scan; past it the tool is stopped and the rest dropped (0 = no cap)
+MAX_FINDINGS = int(os.getenv("SECURITY_MAX_FINDINGS", "2000"))
+READ_CHUNK_CHARS = 64 * 1024
+
+DECODER = json.JSONDecoder()
+NUMBER_RE = re.compile(r"[-+.eE0-9]*")
+WHITESPACE = " \t\r\n"
+
+
+class JsonStream:
+    """
+    Incremental reader for one JSON document arriving over a file object.
+
+    Only the entry being decoded is held in memory: `members()` walks to
+    a top-level key and yields the elements of the array (or the
+    name/value pairs of the object) found there one by one. Everything
+    before it is skipped a member at a time, so e.g. Bandit's per-file
+    metrics never sit in memory as a whole.
+    """
+
+    def __init__(self, f, chunk_chars: int = READ_CHUNK_CHARS):
+        self.f = f
+        self.chunk_chars = chunk_chars
+        self.buf = ""
+        self.pos = 0
+
+    def _fill(self, keep_from: int) -> bool:
+        """Append the next chunk, dropping text before `keep_from`. False at end of input."""
+        data = self.f.read(self.chunk_chars)
+        if not data:
+            return False
+        self.buf = self.buf[keep_from:] + data
+        self.pos -= keep_from
+        return True
+
+    def peek(self) -> str:
+        """The next non-whitespace character ("" at end of input), without consuming it."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill(self.pos):
+                return ""
+
+    def _expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}, found {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value, reading more input until it is complete."""
+        if not self.peek():
+            raise ValueError("Unexpected end of JSON input")
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Most likely cut off at the end of the buffer; fails for real once input runs out
+                if not self._fill(self.pos):
+                    raise
+                continue
+            # A number running to the end of the buffer may continue in the next chunk
+            number = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if number and NUMBER_RE.match(self.buf, self.pos).end() == len(self.buf) and self._fill(self.pos):
+                continue
+            self.pos = end
+            return value
+
+    def skip(self):
+        """Move past the next value. Containers are walked entry by entry, so none is held whole."""
+        if self.peek() in ("[", "{"):
+            for _ in self._entries():
+                pass
+        else:
+            self.value()
+
+    def _entries(self):
+        opening = self.peek()
+        if opening not in ("[", "{"):
+            raise ValueError(f"Expected an array or object at offset {self.pos}")
+        self.pos += 1
+        while True:
+            char = self.peek()
+            if char in ("]", "}"):
+                self.pos += 1
+                return
+            if char == ",":
+                self.pos += 1
+                continue
+            if not char:
+                raise ValueError("Unexpected end of JSON input")
+            if opening == "{":
+                name = self.value()
+                self._expect(":")
+                yield name, self.value()
+            else:
+                yield self.value()
+
+    def members(self, key: str | None = None):
+        """
+        Yield the entries of the container at top-level `key` (or of the
+        top-level container itself when `key` is None): the elements of
+        an array, or (name, value) pairs of an object. Yields nothing if
+        the key is absent.
+        """
+        if key is not None:
+            self._expect("{")
+            while True:
+                char = self.peek()
+                if char == "}":
+                    return
+                if char == ",":
+                    self.pos += 1
+                    continue
+                name = self.value()
+                self._expect(":")
+                if name == key:
+                    break
+                self.skip()
+        yield from self._entries()
+
+
+@contextmanager
+def tool_output(command: list[str], timeout: float | None = None, cwd: str | None = None):
+    """
+    Run a tool (in `cwd`, if given) and yield a JsonStream over its stdout as it is produced.
+
+    The process is killed when the block exits early (e.g. a findings cap
+    was reached) and after `timeout` seconds, in which case the parse
+    error caused by its cut-off output is raised as TimeoutExpired.
+    """
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=stderr, text=True, encoding="utf-8", errors="replace", cwd=cwd
+        )
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            proc.kill()
+
+        timer = threading.Timer(timeout, expire) if timeout else None
+        if timer:
+            timer.daemon = True
+            timer.start()
+        try:
+            yield JsonStream(proc.stdout)
+        except ValueError:
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(command, timeout)
+            stderr.seek(max(stderr.seek(0, os.SEEK_END) - 2000, 0))
+            tail = stderr.read().decode("utf-8", errors="replace").strip()
+            if tail:
+                print(f"{os.path.basename(command[0])} stderr: {tail}")
+            raise
+        finally:
+            if timer:
+                timer.cancel()
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+
+
+def take(issues, limit: int, tool: str) -> list:
+    """Collect up to `limit` issues (0 = all), then close the generator, which stops the tool."""
+    found = []
+    try:
+        for issue in issues:
+            if limit and len(found) >= limit:
+                print(f"⚠️  {tool}: stopped at {limit} findings (SECURITY_MAX_FINDINGS)")
+                break
+            found.append(issue)
+    finally:
+        issues.close()
+    return found
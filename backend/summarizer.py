@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import json
+import os
+import posixpath
+
+from analysis_cache import AnalysisCache
+from context_packer import file_priority
+from ingest import FileChunk
+from metrics import STAGE_SECONDS
+from ollama_client import OllamaClient
+from retrieval import estimate_tokens
+
+
+# Most files summarized per repo (highest priority first) and code tokens sent per summarization call
+SUMMARY_MAX_FILES = int(os.getenv("SUMMARY_MAX_FILES", "300"))
+SUMMARY_BATCH_TOKENS = int(os.getenv("SUMMARY_BATCH_TOKENS", "2000"))
+# Smaller repos are analyzed from their packed key files alone; a summary costs one model call per batch of files
+SUMMARY_MIN_BYTES = int(os.getenv("SUMMARY_MIN_KB", "256")) * 1024
+# Bump whenever the summary prompts change
+SUMMARY_PROMPT_VERSION = 1
+# A directory digest longer than this (tokens) is condensed by the model before moving up a level
+DIGEST_TOKENS = 600
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def parse_json_object(raw: str | None) -> dict:
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw.replace("```json", "").replace("```", "").strip())
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+class RepoSummarizer:
+    """
+    Map-reduce summaries for repositories too large for one prompt.
+
+    Map: files are summarized in batches of about SUMMARY_BATCH_TOKENS,
+    all batches in flight at once (the Ollama client bounds real
+    concurrency). Reduce: each directory's file and subdirectory
+    summaries are joined into a digest, condensed by the model only when
+    it grows past DIGEST_TOKENS, and passed up to the parent.
+
+    File summaries are cached by content hash and directory summaries by
+    digest hash, so after a small change only the edited files and the
+    directories above them are summarized again.
+    """
+
+    def __init__(
+        self,
+        llm: OllamaClient,
+        cache: AnalysisCache,
+        max_files: int = SUMMARY_MAX_FILES,
+        batch_tokens: int = SUMMARY_BATCH_TOKENS,
+    ):
+        self.llm = llm
+        self.cache = cache
+        self.max_files = max_files
+        self.batch_tokens = batch_tokens
+
+    def _key(self, kind: str, digest: str) -> str:
+        return self.cache.make_key(kind, digest, SUMMARY_PROMPT_VERSION, self.llm.model)
+
+    def leaf_texts(self, chunks: list[FileChunk]) -> dict[str, str]:
+        """
+        Highest-priority files and their opening lines (imports, docstrings,
+        first definitions), each within a quarter of a batch so several
+        files share one call.
+        """
+        files: dict[str, list[FileChunk]] = {}
+        for chunk in chunks:
+            files.setdefault(chunk.path, []).append(chunk)
+        order = sorted(enumerate(files), key=lambda item: (file_priority(item[1]), item[0]))
+        limit = self.batch_tokens // 4
+        texts = {}
+        for _, path in order:
+            if len(texts) >= self.max_files or file_priority(path)[0] >= 9:
+                break
+            lines = []
+            used = 0
+            for chunk in files[path]:
+                for line in chunk.text.splitlines(keepends=True):
+                    used += estimate_tokens(line)
+                    if used > limit:
+                        break
+                    lines.append(line)
+                if used > limit:
+                    break
+            text = "".join(lines)
+            if text.strip():
+                texts[path] = text
+        return texts
+
+    async def summarize_files(self, texts: dict[str, str], progress=None, request=None) -> dict[str, str]:
+        """Summaries of every file in `texts` the model answered for, cached ones first."""
+        keys = {path: self._key("file_summary", content_hash(text)) for path, text in texts.items()}
+        # The cache blocks on SQLite: look every file up in one call, off the event loop
+        cached = await asyncio.to_thread(self.cache.get_many, list(set(keys.values())))
+        summaries = {path: cached[key] for path, key in keys.items() if key in cached}
+        pending = [path for path in texts if path not in summaries]
+
+        batches = []
+        batch, used = [], 0
+        for path in pending:
+            cost = estimate_tokens(texts[path]) + estimate_tokens(path) + 8
+            if batch and used + cost > self.batch_tokens:
+                batches.append(batch)
+                batch, used = [], 0
+            batch.append(path)
+            used += cost
+        if batch:
+            batches.append(batch)
+        if batches:
+            print(f"🧾 Summarizing {len(pending)} files in {len(batches)} batches ({len(summaries)} cached)...")
+
+        done = 0
+
+        async def run(batch: list[str]):
+            nonlocal done
+            listing = "".join(f"\n\n--- FILE: {path} ---\n{texts[path]}" for path in batch)
+            prompt = f"""Summarize what each file below does in one or two sentences, for a developer new to the codebase.
+Return ONLY a JSON object mapping each file path to its summary, like {{"path/to/file": "summary"}}.
+{listing}"""
+            answers = parse_json_object(await self.llm.generate(prompt, is_json=True, request=request))
+            answered = {}
+            for path in batch:
+                summary = answers.get(path)
+                if isinstance(summary, str) and summary.strip():
+                    summaries[path] = summary.strip()
+                    answered[keys[path]] = summaries[path]
+            await asyncio.to_thread(self.cache.set_many, answered)
+            done += 1
+            if progress:
+                progress(done, len(batches))
+
+        await asyncio.gather(*(run(b) for b in batches))
+        return summaries
+
+    async def condense(self, path: str, digest: str, max_tokens: int, request=None) -> str:
+        """The digest if it is short enough, else a cached model summary of it."""
+        if estimate_tokens(digest) <= max_tokens:
+            return digest
+        key = self._key("dir_summary", content_hash(f"{path}\0{max_tokens}\0{digest}"))
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return cached
+        what = f"the directory `{path}`" if path else "the whole repository"
+        prompt = f"""Below are summaries of the files and subdirectories in {what} of a codebase.
+Write a summary of {what} in at most {max_tokens * 3 // 4} words: its purpose, main components and how they fit together.
+Output only the summary text.
+
+{digest}"""
+        summary = (await self.llm.generate(prompt, request=request) or "").strip()
+        if not summary:
+            # Model unavailable: pass the digest up, trimmed to size
+            return digest[: max_tokens * 3]
+        await asyncio.to_thread(self.cache.set, key, summary)
+        return summary
+
+    async def summarize(self, chunks: list[FileChunk], max_tokens: int, progress=None, request=None) -> str:
+        """
+        A repo-level summary covering every summarized file, at most about
+        `max_tokens` tokens. Passing the incoming `request` cancels the
+        model calls if that client disconnects.
+        """
+        with STAGE_SECONDS.time(stage="summarize"):
+            return await self._summarize(chunks, max_tokens, progress, request)
+
+    async def _summarize(self, chunks: list[FileChunk], max_tokens: int, progress=None, request=None) -> str:
+        texts = self.leaf_texts(chunks)
+        files = await self.summarize_files(texts, progress, request)
+        if not files:
+            return ""
+
+        # Directory -> (child file summaries, child directories), for every ancestor of a summarized file
+        dirs: dict[str, tuple[list, list]] = {"": ([], [])}
+        links = []
+        for path in texts:
+            parent = posixpath.dirname(path)
+            child = parent
+            while child not in dirs:
+                dirs[child] = ([], [])
+                up = posixpath.dirname(child)
+                links.append((up, child))
+                child = up
+            for up, child in links:
+                dirs[up][1].append(child)
+            links.clear()
+            if path in files:
+                dirs[parent][0].append(f"- {posixpath.basename(path)}: {files[path]}")
+
+        # Deepest directories first; each level is condensed concurrently
+        summaries: dict[str, str] = {}
+        for depth in sorted({d.count("/") + bool(d) for d in dirs}, reverse=True):
+            level = [d for d in dirs if d.count("/") + bool(d) == depth]
+            digests = []
+            for d in level:
+                file_lines, subdirs = dirs[d]
+                lines = [
+                    f"- {posixpath.basename(s)}/: " + summaries[s].replace("\n", "\n  ")
+                    for s in sorted(subdirs)
+                    if summaries.get(s)
+                ]
+                digests.append("\n".join(lines + sorted(file_lines)))
+            results = await asyncio.gather(
+                *(
+                    self.condense(d, digest, max_tokens if d == "" else DIGEST_TOKENS, request)
+                    for d, digest in zip(level, digests)
+                )
+            )
+            summaries.update(zip(level, results))
+        return summaries[""]
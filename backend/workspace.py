@@ -0,0 +1,253 @@
+import os
+import shutil
+import time
+from collections import Counter
+from contextlib import contextmanager
+from threading import Condition
+
+from git_history import aggregates_path
+from ingest import BASE_DIR, handle_remove_readonly, is_managed_clone, load_json, manifest_path, save_json
+from security.incremental import state_path
+
+
+# Disk budget for cloned repositories under workspace_data
+WORKSPACE_MAX_BYTES = int(float(os.getenv("WORKSPACE_MAX_GB", "20")) * 1024 ** 3)
+WORKSPACE_INDEX = os.path.join(BASE_DIR, "workspace.json")
+WORKSPACE_INDEX_VERSION = 1
+# Last-access times are flushed to disk at most this often (seconds)
+TOUCH_FLUSH_INTERVAL = 30
+
+
+class CloneEvicted(RuntimeError):
+    """A leased clone was deleted by eviction before the lease was granted."""
+
+
+def disk_usage(path: str) -> int:
+    """Bytes of disk a directory tree occupies (allocated blocks, not apparent size)."""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files + dirs:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            total += getattr(st, "st_blocks", 0) * 512 or st.st_size
+    return total
+
+
+class WorkspaceManager:
+    """
+    Keeps the cloned repositories in workspace_data under a disk quota.
+
+    Each clone's size, revision and last access are tracked in a small
+    JSON index; a clone is measured again only when its revision changes.
+    When a new clone pushes the total over the quota, the least recently
+    used clones are deleted, along with everything kept about them outside
+    the clone (file manifest, security scan state, git insights). A clone that
+    holds a lease (it is being cloned, scanned, refreshed or analyzed) is
+    never evicted, and a refresh only moves its checkout once it is the
+    clone's sole lease holder (see exclusive()). `on_evict(url)` is called for every clone removed so
+    cached contexts pointing at it can be dropped.
+    """
+
+    def __init__(self, max_bytes: int = WORKSPACE_MAX_BYTES, index_path: str = WORKSPACE_INDEX, on_evict=None):
+        self.max_bytes = max_bytes
+        self.index_path = index_path
+        self.on_evict = on_evict
+        self._lock = Condition()
+        self._leases = Counter()
+        # Clones being deleted; lease() waits for these instead of racing the delete
+        self._evicting: set[str] = set()
+        # Clones whose checkout is being moved (see exclusive()); lease() waits for these too
+        self._updating: set[str] = set()
+        self._entries = self._load()
+        self._dirty_since = None
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.blocked = 0
+        self._adopt_untracked()
+
+    def _load(self) -> dict:
+        data = load_json(self.index_path, WORKSPACE_INDEX_VERSION)
+        return data.get("repos", {}) if data else {}
+
+    def _save(self):
+        if save_json(self.index_path, {"version": WORKSPACE_INDEX_VERSION, "repos": self._entries}, "workspace index"):
+            self._dirty_since = None
+
+    @contextmanager
+    def lease(self, path: str | None, must_exist: bool = True):
+        """
+        Protect a clone from eviction while the block runs. Raises
+        CloneEvicted if the clone is no longer on disk, e.g. because it was
+        evicted while the lease waited; callers that are about to create
+        the clone pass must_exist=False.
+        """
+        if not is_managed_clone(path):
+            yield
+            return
+        name = os.path.basename(path)
+        with self._lock:
+            self._lock.wait_for(lambda: name not in self._evicting and name not in self._updating)
+            if must_exist and not os.path.isdir(path):
+                raise CloneEvicted(f"Clone {name} is no longer on disk; load the repository again")
+            self._leases[name] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._release(name)
+            self.touch(path)
+
+    @contextmanager
+    def exclusive(self, path: str | None):
+        """
+        Inside a lease of `path`, get the clone to ourselves for a change to
+        its checkout. Yields False, changing nothing, if anyone else holds a
+        lease on it; otherwise yields True and holds new leases off until
+        the block is done.
+        """
+        if not is_managed_clone(path):
+            yield True
+            return
+        name = os.path.basename(path)
+        with self._lock:
+            shared = self._leases[name] > 1
+            if not shared:
+                self._updating.add(name)
+        if shared:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            with self._lock:
+                self._updating.discard(name)
+                self._lock.notify_all()
+
+    def _release(self, name: str):
+        self._leases[name] -= 1
+        if self._leases[name] <= 0:
+            del self._leases[name]
+
+    def touch(self, path: str | None):
+        """Mark a clone as just used."""
+        if not is_managed_clone(path):
+            return
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(os.path.basename(path))
+            if entry is None:
+                return
+            entry["last_access"] = now
+            if self._dirty_since is None:
+                self._dirty_since = now
+            elif now - self._dirty_since > TOUCH_FLUSH_INTERVAL:
+                self._save()
+
+    def record(self, url: str, path: str, revision: str | None = None):
+        """
+        Register a clone checked out at `revision` (measuring it only if it
+        is new or its revision changed) and enforce the quota. The recorded
+        clone itself is never evicted by this call.
+        """
+        if not is_managed_clone(path) or not os.path.isdir(path):
+            return
+        name = os.path.basename(path)
+        with self._lock:
+            entry = self._entries.get(name)
+            measured = entry is not None and revision is not None and entry.get("revision") == revision
+        size = entry["size"] if measured else disk_usage(path)
+        with self._lock:
+            self._entries[name] = {"url": url, "size": size, "revision": revision, "last_access": time.time()}
+            self._save()
+        self.enforce(keep=path)
+
+    def _adopt_untracked(self):
+        """
+        Sync the index with the clones on disk, once at startup: index clones
+        missing from it (e.g. from before it existed), drop ones deleted by hand.
+        """
+        try:
+            names = [n for n in os.listdir(BASE_DIR) if n.startswith("repo_") and os.path.isdir(os.path.join(BASE_DIR, n))]
+        except OSError:
+            return
+        changed = False
+        for name in list(self._entries):
+            if name not in names:
+                del self._entries[name]
+                changed = True
+        for name in names:
+            if name not in self._entries:
+                path = os.path.join(BASE_DIR, name)
+                self._entries[name] = {"url": None, "size": disk_usage(path), "revision": None, "last_access": os.path.getmtime(path)}
+                changed = True
+        if changed:
+            self._save()
+
+    def enforce(self, keep: str | None = None) -> list[str]:
+        """Evict least recently used, unleased clones until usage fits the quota. Returns evicted names."""
+        keep_name = os.path.basename(keep) if keep else None
+        evicted = []
+        with self._lock:
+            total = sum(e["size"] for e in self._entries.values())
+            if total <= self.max_bytes:
+                return evicted
+            candidates = sorted(self._entries.items(), key=lambda item: item[1]["last_access"])
+            victims = []
+            for name, entry in candidates:
+                if total <= self.max_bytes:
+                    break
+                if name == keep_name or self._leases[name] > 0:
+                    continue
+                victims.append((name, entry))
+                self._evicting.add(name)
+                total -= entry["size"]
+            if total > self.max_bytes:
+                self.blocked += 1
+                print(f"⚠️  Workspace over quota but remaining clones are in use ({total / 1024 ** 2:.0f} MB)")
+
+        for name, entry in victims:
+            path = os.path.join(BASE_DIR, name)
+            try:
+                shutil.rmtree(path, onerror=handle_remove_readonly)
+                for artifact in (manifest_path(path), state_path(path), aggregates_path(path)):
+                    try:
+                        os.remove(artifact)
+                    except OSError:
+                        pass
+            except Exception as e:
+                print(f"⚠️  Could not evict {path}: {e}")
+                with self._lock:
+                    self._evicting.discard(name)
+                    self._lock.notify_all()
+                continue
+            with self._lock:
+                self._entries.pop(name, None)
+                self._evicting.discard(name)
+                self._lock.notify_all()
+                self.evictions += 1
+                self.evicted_bytes += entry["size"]
+            evicted.append(name)
+            print(f"🧹 Evicted clone {name} ({entry['size'] / 1024 ** 2:.1f} MB, {entry['url'] or 'unknown url'})")
+            if self.on_evict and entry["url"]:
+                self.on_evict(entry["url"])
+
+        if evicted:
+            with self._lock:
+                self._save()
+        return evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            used = sum(e["size"] for e in self._entries.values())
+            return {
+                "repos": len(self._entries),
+                "bytes": used,
+                "max_bytes": self.max_bytes,
+                "usage": round(used / self.max_bytes, 4) if self.max_bytes else 0.0,
+                "leased": len(self._leases),
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+                "blocked": self.blocked,
+            }
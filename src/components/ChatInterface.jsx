@@ -53,19 +53,45 @@ const ChatInterface = ({ repoName, fullUrl }) => {
     setIsTyping(true);
 
     try {
-      const response = await fetch("/chat", {
+      const response = await fetch("/chat/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ message: userMsg.text, repo_url: fullUrl }),
       });
 
-      if (!response.ok) throw new Error("Backend failed");
-
-      const data = await response.json();
-      setMessages((prev) => [
-        ...prev,
-        { id: (Date.now() + 1).toString(), role: "model", text: data.response },
-      ]);
+      if (!response.ok || !response.body) throw new Error("Backend failed");
+
+      // The backend streams NDJSON lines: {"token"}..., then {"done"} or {"error"}
+      const replyId = (Date.now() + 1).toString();
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let text = "";
+      let started = false;
+
+      const appendLine = (line) => {
+        if (!line.trim()) return;
+        const event = JSON.parse(line);
+        if (event.token) text += event.token;
+        if (event.error) text = text || event.error;
+        if (!started) {
+          started = true;
+          setIsTyping(false);
+          setMessages((prev) => [...prev, { id: replyId, role: "model", text }]);
+        } else {
+          setMessages((prev) => prev.map((m) => (m.id === replyId ? { ...m, text } : m)));
+        }
+      };
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines.forEach(appendLine);
+      }
+      appendLine(buffer);
     } catch (error) {
       console.error(error);
       setMessages((prev) => [
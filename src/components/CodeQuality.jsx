@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from "react";
 import { Gauge, RefreshCw, TrendingUp, AlertCircle, CheckCircle, Award } from "lucide-react";
 import { clsx } from "clsx";
+import { runJob } from "../jobs";
 
 const ScoreMeter = ({ score, label, notes, color }) => {
   const [animated, setAnimated] = useState(0);
@@ -46,19 +47,16 @@ const getGradeColor = (grade) => {
 const CodeQuality = ({ fullUrl }) => {
   const [data, setData] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState("");
   const [error, setError] = useState(null);
 
   const fetchQuality = async () => {
     if (!fullUrl) return;
     setLoading(true);
+    setProgress("");
     setError(null);
     try {
-      const res = await fetch("/api/analyze-quality", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ repo_url: fullUrl }),
-      });
-      const result = await res.json();
+      const result = await runJob("quality", { repo_url: fullUrl }, (job) => setProgress(job.message));
       if (result.error) throw new Error(result.error);
       setData(result);
     } catch (e) {
@@ -109,7 +107,7 @@ const CodeQuality = ({ fullUrl }) => {
               <div className="w-16 h-16 rounded-full border-4 border-[#8B5CF6]/20 border-t-[#8B5CF6] animate-spin" />
               <Gauge className="absolute inset-0 m-auto text-[#8B5CF6]" size={24} />
             </div>
-            <p className="text-[#94A3B8] text-sm">Analyzing code quality with AI...</p>
+            <p className="text-[#94A3B8] text-sm">{progress || "Analyzing code quality with AI..."}</p>
           </div>
         )}
 
@@ -20,15 +20,42 @@ const DocGenerator = ({ repoUrl }) => {
     if (!doc) return;
 
     try {
-      const response = await fetch("/generate", {
+      const response = await fetch("/generate/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ url: repoUrl, doc_type: doc.filename }),
       });
-      if (!response.ok) throw new Error("Backend failed");
-      const data = await response.json();
-      setDocs((prev) => prev.map((d) => (d.id === docId ? { ...d, status: "complete", content: data.markdown } : d)));
+      if (!response.ok || !response.body) throw new Error("Backend failed");
+
+      // Show the preview as soon as the first tokens arrive and keep appending
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let content = "";
+      let failed = false;
+
+      const appendLine = (line) => {
+        if (!line.trim()) return;
+        const event = JSON.parse(line);
+        if (event.token) content += event.token;
+        if (event.error) failed = true;
+        setDocs((prev) => prev.map((d) => (d.id === docId ? { ...d, status: "complete", content } : d)));
+      };
+
       setActivePreview(docId);
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines.forEach(appendLine);
+      }
+      appendLine(buffer);
+      if (failed && !content) {
+        content = `# ${doc.filename}\n\nGeneration failed.`;
+        setDocs((prev) => prev.map((d) => (d.id === docId ? { ...d, status: "complete", content } : d)));
+      }
     } catch (error) {
       console.error("Generation failed:", error);
       setDocs((prev) => prev.map((d) => (d.id === docId ? { ...d, status: "idle" } : d)));
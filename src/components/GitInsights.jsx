@@ -9,6 +9,7 @@ import {
   Loader2,
   TrendingUp,
 } from "lucide-react";
+import { runJob } from "../jobs";
 
 const ContributorBar = ({ name, commits, maxCommits }) => (
   <div className="flex items-center gap-3">
@@ -55,19 +56,16 @@ const CommitFrequencyChart = ({ data }) => {
 const GitInsights = ({ fullUrl }) => {
   const [data, setData] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState("");
   const [error, setError] = useState(null);
 
   const fetchInsights = async () => {
     if (!fullUrl) return;
     setLoading(true);
+    setProgress("");
     setError(null);
     try {
-      const res = await fetch("/api/git-insights", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ repo_url: fullUrl }),
-      });
-      const result = await res.json();
+      const result = await runJob("git_insights", { repo_url: fullUrl }, (job) => setProgress(job.message));
       if (result.error) throw new Error(result.error);
       setData(result);
     } catch (e) {
@@ -109,7 +107,7 @@ const GitInsights = ({ fullUrl }) => {
         {loading && (
           <div className="flex flex-col items-center py-12 gap-3">
             <Loader2 size={36} className="animate-spin text-[#06B6D4]" />
-            <p className="text-[#94A3B8] text-sm">Analyzing git history...</p>
+            <p className="text-[#94A3B8] text-sm">{progress || "Analyzing git history..."}</p>
           </div>
         )}
 
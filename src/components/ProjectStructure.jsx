@@ -1,13 +1,41 @@
 import React, { useState, useEffect } from "react";
 import { Folder, File, ChevronRight, ChevronDown, Loader2 } from "lucide-react";
 
-const FileTreeNode = ({ node, level = 0 }) => {
+const fetchStructurePage = async (fullUrl, path = "", offset = 0) => {
+  const res = await fetch("/structure", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ url: fullUrl, path, offset }),
+  });
+  return res.json();
+};
+
+const FileTreeNode = ({ node, fullUrl, level = 0 }) => {
   const [isOpen, setIsOpen] = useState(false);
+  const [children, setChildren] = useState(node.children || null);
+  const [loadingChildren, setLoadingChildren] = useState(false);
   const isFolder = node.type === "folder";
   const paddingLeft = level * 16;
+  const childCount = node.child_count ?? (children ? children.length : 0);
+
+  // Folders deeper than the initial response are fetched on first open, one page at a time
+  const loadChildren = async (offset = 0) => {
+    setLoadingChildren(true);
+    try {
+      const data = await fetchStructurePage(fullUrl, node.path, offset);
+      const page = data.structure || [];
+      setChildren((prev) => (offset === 0 ? page : [...(prev || []), ...page]));
+    } catch (e) {
+      console.error("Failed to load folder", e);
+    } finally {
+      setLoadingChildren(false);
+    }
+  };
 
   const handleToggle = () => {
-    if (isFolder) setIsOpen(!isOpen);
+    if (!isFolder) return;
+    if (!isOpen && children === null && childCount > 0) loadChildren();
+    setIsOpen(!isOpen);
   };
 
   return (
@@ -36,15 +64,35 @@ const FileTreeNode = ({ node, level = 0 }) => {
         <span className="truncate">{node.name}</span>
       </div>
 
-      {isOpen && node.children && (
+      {isOpen && (
         <div>
-          {node.children.map((child, idx) => (
+          {(children || []).map((child, idx) => (
             <FileTreeNode
               key={`${child.name}-${idx}`}
               node={child}
+              fullUrl={fullUrl}
               level={level + 1}
             />
           ))}
+          {loadingChildren ? (
+            <div
+              className="flex items-center gap-2 py-1.5 text-sm text-[#94A3B8]"
+              style={{ paddingLeft: `${paddingLeft + 24}px` }}
+            >
+              <Loader2 size={14} className="animate-spin" /> Loading...
+            </div>
+          ) : (
+            children &&
+            children.length < childCount && (
+              <button
+                onClick={() => loadChildren(children.length)}
+                className="py-1.5 text-sm text-[#3B82F6] hover:underline"
+                style={{ paddingLeft: `${paddingLeft + 24}px` }}
+              >
+                Show {childCount - children.length} more
+              </button>
+            )
+          )}
         </div>
       )}
     </div>
@@ -53,7 +101,9 @@ const FileTreeNode = ({ node, level = 0 }) => {
 
 const ProjectStructure = ({ fullUrl }) => {
   const [structure, setStructure] = useState([]);
+  const [total, setTotal] = useState(0);
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     if (!fullUrl) return;
@@ -61,13 +111,9 @@ const ProjectStructure = ({ fullUrl }) => {
     const fetchStructure = async () => {
       setLoading(true);
       try {
-        const res = await fetch("/structure", {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({ url: fullUrl }),
-        });
-        const data = await res.json();
+        const data = await fetchStructurePage(fullUrl);
         setStructure(data.structure || []);
+        setTotal(data.total || 0);
       } catch (e) {
         console.error("Failed to load structure", e);
       } finally {
@@ -78,6 +124,18 @@ const ProjectStructure = ({ fullUrl }) => {
     fetchStructure();
   }, [fullUrl]);
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const data = await fetchStructurePage(fullUrl, "", structure.length);
+      setStructure((prev) => [...prev, ...(data.structure || [])]);
+    } catch (e) {
+      console.error("Failed to load structure", e);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return (
     <div className="bg-[#2A3254] rounded-2xl border border-[#4A5578]/50 p-6 shadow-lg flex flex-col h-full min-h-[400px]">
       <h3 className="text-xl font-semibold text-white mb-6 flex items-center gap-2">
@@ -92,8 +150,17 @@ const ProjectStructure = ({ fullUrl }) => {
         ) : (
           <div className="space-y-1">
             {structure.map((node, idx) => (
-              <FileTreeNode key={idx} node={node} />
+              <FileTreeNode key={idx} node={node} fullUrl={fullUrl} />
             ))}
+            {structure.length < total && (
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="py-1.5 px-2 text-sm text-[#3B82F6] hover:underline"
+              >
+                {loadingMore ? "Loading..." : `Show ${total - structure.length} more`}
+              </button>
+            )}
             {structure.length === 0 && (
               <p className="text-[#94A3B8] italic p-4">Structure unavailable</p>
             )}
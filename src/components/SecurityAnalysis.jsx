@@ -7,6 +7,7 @@ import {
   Filter,
 } from "lucide-react";
 import { clsx } from "clsx";
+import { runJob } from "../jobs";
 
 const SEVERITY_CONFIG = {
   CRITICAL: { color: "border-l-[#F43F5E]", badge: "bg-[#F43F5E]/20 text-[#F43F5E]", dot: "bg-[#F43F5E]" },
@@ -17,20 +18,19 @@ const SEVERITY_CONFIG = {
 
 const SecurityAnalysis = ({ fullUrl }) => {
   const [issues, setIssues] = useState([]);
+  const [failedTools, setFailedTools] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState("");
   const [filter, setFilter] = useState("ALL");
 
   const fetchSecurity = async () => {
     if (!fullUrl) return;
     setLoading(true);
+    setProgress("");
     try {
-      const res = await fetch("/api/analyze-security", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ repo_url: fullUrl }),
-      });
-      const data = await res.json();
+      const data = await runJob("security", { repo_url: fullUrl }, (job) => setProgress(job.message));
       setIssues(data.issues || []);
+      setFailedTools(data.failed_tools || []);
     } catch (e) {
       console.error("Security scan failed", e);
     } finally {
@@ -56,7 +56,7 @@ const SecurityAnalysis = ({ fullUrl }) => {
           </div>
           <div>
             <h2 className="text-base font-semibold text-white">Security Analysis</h2>
-            <p className="text-xs text-[#94A3B8]">{loading ? "Scanning..." : `${issues.length} issue${issues.length !== 1 ? "s" : ""} found`}</p>
+            <p className="text-xs text-[#94A3B8]">{loading ? "Scanning..." : `${issues.length} issue${issues.length !== 1 ? "s" : ""} found${failedTools.length ? ` (incomplete: ${failedTools.join(", ")} did not finish)` : ""}`}</p>
           </div>
         </div>
         <button onClick={fetchSecurity} disabled={loading} className="p-2 rounded-lg bg-[#1A1F3A] border border-[#4A5578]/50 text-[#94A3B8] hover:text-white transition-colors disabled:opacity-40">
@@ -89,7 +89,7 @@ const SecurityAnalysis = ({ fullUrl }) => {
         {loading && (
           <div className="flex flex-col items-center justify-center h-40 gap-3">
             <Loader2 className="animate-spin text-[#F43F5E]" size={28} />
-            <p className="text-sm text-[#94A3B8]">Scanning for vulnerabilities...</p>
+            <p className="text-sm text-[#94A3B8]">{progress || "Scanning for vulnerabilities..."}</p>
           </div>
         )}
 
@@ -10,6 +10,7 @@ import {
   FileCode,
 } from "lucide-react";
 import ReactMarkdown from "react-markdown";
+import { runJob } from "../jobs";
 
 const FRAMEWORKS = [
   { value: "auto", label: "Auto-detect" },
@@ -24,6 +25,7 @@ const FRAMEWORKS = [
 const TestGenerator = ({ fullUrl, repoName }) => {
   const [data, setData] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState("");
   const [framework, setFramework] = useState("auto");
   const [expandedFile, setExpandedFile] = useState(null);
   const [copiedId, setCopiedId] = useState(null);
@@ -48,16 +50,12 @@ const TestGenerator = ({ fullUrl, repoName }) => {
   const handleGenerate = async () => {
     if (!fullUrl) return;
     setLoading(true);
+    setProgress("");
     setError(null);
     setData(null);
 
     try {
-      const res = await fetch("/api/generate-tests", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ repo_url: fullUrl, framework }),
-      });
-      const result = await res.json();
+      const result = await runJob("tests", { repo_url: fullUrl, framework }, (job) => setProgress(job.message));
       if (result.error) throw new Error(result.error);
       setData(result);
       if (result.files?.length > 0) setExpandedFile(0);
@@ -125,7 +123,7 @@ const TestGenerator = ({ fullUrl, repoName }) => {
         {loading && (
           <div className="flex flex-col items-center justify-center py-12 gap-3">
             <Loader2 size={36} className="animate-spin text-[#10B981]" />
-            <p className="text-[#94A3B8] text-sm">Generating tests with AI... this may take a moment</p>
+            <p className="text-[#94A3B8] text-sm">{progress || "Generating tests with AI... this may take a moment"}</p>
           </div>
         )}
 
@@ -0,0 +1,62 @@
+// Long analyses run as background jobs: submit one, then follow its progress until it finishes.
+// No request stays open for the whole analysis, so proxy timeouts don't cut it off.
+
+const POLL_INTERVAL_MS = 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+const isFinished = (job) => job.status === "done" || job.status === "failed";
+
+const finish = (job) => {
+  if (job.status === "failed") throw new Error(job.error || "Analysis failed");
+  return job.result;
+};
+
+/**
+ * Run an analysis job (kind: "security" | "quality" | "tests" | "git_insights") and resolve with its result.
+ * `onProgress(job)` is called with every progress update ({ status, progress, message }).
+ */
+export const runJob = async (kind, params, onProgress = () => {}) => {
+  const res = await fetch("/api/jobs", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ kind, ...params }),
+  });
+  if (!res.ok) throw new Error(`Could not start the analysis (${res.status})`);
+  let job = await res.json();
+  onProgress(job);
+
+  // Follow the job's NDJSON event stream: one line per progress change, the last one with the result
+  try {
+    const events = await fetch(`/api/jobs/${job.job_id}/events`);
+    if (events.ok && events.body) {
+      const reader = events.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (!isFinished(job)) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        for (const line of lines.filter((l) => l.trim())) {
+          job = JSON.parse(line);
+          onProgress(job);
+        }
+      }
+    }
+  } catch (e) {
+    console.warn("Job event stream interrupted, polling instead", e);
+  }
+  if (isFinished(job)) return finish(job);
+
+  // The stream was cut short (e.g. by a proxy): poll until the job is done
+  while (true) {
+    await sleep(POLL_INTERVAL_MS);
+    const poll = await fetch(`/api/jobs/${job.job_id}`);
+    if (!poll.ok) throw new Error(`Lost track of the analysis (${poll.status})`);
+    job = await poll.json();
+    onProgress(job);
+    if (isFinished(job)) return finish(job);
+  }
+};